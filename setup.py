@@ -30,6 +30,7 @@ setuptools.setup(
         "seaborn",
         "pytest",
         "tqdm",
+        "joblib",
     ],
     package_dir={"": "src"},
     packages=setuptools.find_packages(where="src"),
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def censor(df, censoring_frequency, random_seed=None): # May need simplification!!!!!!!!! Ryan - 3/1/24 (random sampling) - also check random feature MAF 
+    """
+    Censors instances of a simulated survival dataset (shared by the survival and rare SNP simulators). Instances are shuffled and then
+    visited in order, in repeated passes, each being censored (0) with probability duration / max_duration until censoring_frequency of
+    them are censored.
+
+    :param df: simulated dataset with a 'Duration' column
+    :param censoring_frequency: proportion of instances that are censored (0 = censored, 1 = not censored)
+    :param random_seed: seeds the shuffle, and reseeds np.random before each pass (None leaves np.random unseeded)
+    :return: the shuffled dataset with a 'Censoring' column
+    """
+    df['Censoring'] = 1
+    inst_to_censor = int(censoring_frequency * len(df))
+    max_duration = max(df['Duration'])
+    df = df.sample(frac=1, random_state=random_seed).reset_index(drop=True) #randomly shuffled
+    # Each instance is censored (0) when its uniform draw falls below prob = duration / max_duration, as np.random.choice([0, 1], p=[prob, 1 - prob])
+    # decides. choice() normalizes its cdf, so the cutoff is computed the same way - the simulated data stays bit-identical to per-instance choice() calls
+    prob = df['Duration'].to_numpy() / max_duration
+    censor_cutoff = prob / (prob + (1 - prob))
+    censoring = df['Censoring'].to_numpy().copy()
+    censor_count = 0
+    count = 0
+    while censor_count < inst_to_censor:
+        if random_seed:
+            np.random.seed(random_seed + count)
+        choice, assigned = censoring_pass(censor_cutoff, censor_count, inst_to_censor)
+        censoring[:assigned] = choice[:assigned]
+        censor_count += int(np.count_nonzero(choice[:assigned] == 0))
+        count += assigned
+    df['Censoring'] = censoring
+    return df
+
+
+def censoring_pass(censor_cutoff, censor_count, inst_to_censor):
+    """
+    Runs one pass of censor()'s loop over all instances, drawing the pass's uniforms from np.random as one block.
+    Instances are visited in order and each is censored (0) when its draw falls below its censor_cutoff, until inst_to_censor is reached.
+
+    The per-instance loop this replaces drew one value per visited instance and stopped right after the instance that reached the target.
+    The global np.random stream is rewound and advanced by exactly that many draws, so anything drawn afterwards (and any seeded
+    simulation relying on it) is unchanged by drawing the block.
+
+    :param censor_cutoff: array of per-instance censoring probabilities
+    :param censor_count: number of instances censored by previous passes
+    :param inst_to_censor: total number of instances to censor
+    :return: (choice, assigned) - the pass's censoring indicators and the number of leading instances they are assigned to
+    """
+    state = np.random.get_state()
+    choice = (np.random.random_sample(len(censor_cutoff)) >= censor_cutoff).astype(int)
+    censored_before = censor_count + np.cumsum(choice == 0) - (choice == 0) # Censored count when each instance is reached
+    reached_target = np.flatnonzero(censored_before >= inst_to_censor)
+    assigned = reached_target[0] if len(reached_target) > 0 else len(censor_cutoff)
+    np.random.set_state(state)
+    np.random.random_sample(min(assigned + 1, len(censor_cutoff))) # Leave the stream where the per-instance draws would have
+    return choice, assigned
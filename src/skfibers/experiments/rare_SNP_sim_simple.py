@@ -2,6 +2,7 @@ import random
 import copy
 import numpy as np
 import pandas as pd
+from .censoring import censor
 pd.options.mode.chained_assignment = None  # default='warn'
 
 
@@ -310,28 +311,6 @@ def check_parameters(predictive_features, threshold, class_1_count, class_0_coun
     return class_1_binary_list,class_0_binary_list
 
 
-def censor(df, censoring_frequency, random_seed=None):
-    df['Censoring'] = 1
-    inst_to_censor = int(censoring_frequency * len(df))
-    max_duration = max(df['Duration'])
-    df = df.sample(frac=1, random_state=random_seed).reset_index(drop=True) #randomly shuffled
-    censor_count = 0
-    count = 0
-    while censor_count < inst_to_censor:
-        if random_seed:
-            np.random.seed(random_seed + count)
-        for index in range(len(df)):
-            prob = df['Duration'].iloc[index] / max_duration
-            choice = np.random.choice([0, 1], 1, p=[prob, 1 - prob])
-            if censor_count >= inst_to_censor:
-                break
-            if choice == 0:
-                censor_count += 1
-            df['Censoring'].iloc[index] = choice
-            count += 1
-    return df
-
-
 def final_check(df,hr_count,predictive_names,threshold,instances):
     #Final Predictive Feature Check
     lowered_check = 0
@@ -2,6 +2,7 @@ import random
 import copy
 import numpy as np
 import pandas as pd
+from .censoring import censor
 pd.options.mode.chained_assignment = None  # default='warn'
 
 
@@ -51,7 +52,7 @@ def survival_data_simulation(instances=10000, total_features=100, predictive_fea
     df['TrueRiskGroup'] = class_list
 
     # Identify target MAF for each feature in the dataset.
-    MAF_list = [random.uniform(feature_frequency_range[0], feature_frequency_range[1]) for _ in range(instances)]  #FIX???????? to featuers
+    MAF_list = [random.uniform(feature_frequency_range[0], feature_frequency_range[1]) for _ in range(max(instances, total_features))]  #FIX???????? to featuers
     one_count_list = [int(x * instances) for x in MAF_list]
 
     # Generate Predictive Feature Values -------------------------------
@@ -233,28 +234,6 @@ def check_parameters(predictive_features, threshold, hr_count, lr_count):
     return high_binary_list,low_binary_list
 
 
-def censor(df, censoring_frequency, random_seed=None): # May need simplification!!!!!!!!! Ryan - 3/1/24 (random sampling) - also check random feature MAF 
-    df['Censoring'] = 1
-    inst_to_censor = int(censoring_frequency * len(df))
-    max_duration = max(df['Duration'])
-    df = df.sample(frac=1, random_state=random_seed).reset_index(drop=True) #randomly shuffled
-    censor_count = 0
-    count = 0
-    while censor_count < inst_to_censor:
-        if random_seed:
-            np.random.seed(random_seed + count)
-        for index in range(len(df)):
-            prob = df['Duration'].iloc[index] / max_duration
-            choice = np.random.choice([0, 1], 1, p=[prob, 1 - prob])
-            if censor_count >= inst_to_censor:
-                break
-            if choice == 0:
-                censor_count += 1
-            df['Censoring'].iloc[index] = choice
-            count += 1
-    return df
-
-
 def final_check(df,hr_count,predictive_names,threshold,instances):
     #Final Predictive Feature Check
     lowered_check = 0
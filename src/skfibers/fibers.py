@@ -5,6 +5,9 @@ import time
 from sklearn.base import BaseEstimator, TransformerMixin
 from .methods.data_handling import prepare_data
 from .methods.data_handling import calculate_residuals
+from .methods.data_handling import bin_feature_sums
+from .methods.data_handling import covariate_cox_coefficients
+from .methods.data_handling import compact_feature_columns
 from .methods.population import BIN_SET
 from .methods.util import plot_pareto
 from .methods.util import plot_feature_tracking
@@ -19,16 +22,18 @@ from .methods.util import plot_adj_HR_residuals
 from .methods.util import plot_log_rank_adj_HR
 from .methods.util import plot_adj_HR_metric_product
 from .methods.util import cox_prop_hazard
+from .methods.util import bin_cox_prop_hazard
 from .methods.util import transform_value
 from .methods.util import plot_bin_population_heatmap
 from .methods.util import plot_custom_bin_population_heatmap
 from tqdm import tqdm
+from joblib import Parallel, delayed
 
 class FIBERS(BaseEstimator, TransformerMixin):
     def __init__(self, outcome_label="Duration",outcome_type="survival",iterations=100,pop_size=50,tournament_prop=0.2,crossover_prob=0.5,min_mutation_prob=0.1, 
                  max_mutation_prob=0.5,merge_prob=0.1,new_gen=1.0,elitism=0.1,diversity_pressure=0,min_bin_size=1,max_bin_size=None,max_bin_init_size=10,fitness_metric="log_rank", 
                  log_rank_weighting=None,censor_label="Censoring",group_strata_min=0.2,penalty=0.5,group_thresh_list = [1,4],min_thresh=0,max_thresh=5, 
-                 int_thresh=True,thresh_evolve_prob=0.5,multi_thresholding = True,manual_bin_init=None,covariates=None,pop_clean=None,report=None,random_seed=None,verbose=False):
+                 int_thresh=True,thresh_evolve_prob=0.5,multi_thresholding = True,manual_bin_init=None,covariates=None,pop_clean=None,report=None,random_seed=None,n_jobs=1,verbose=False):
 
         """
         A Scikit-Learn compatible implementation of the FIBERS Algorithm.
@@ -87,6 +92,7 @@ class FIBERS(BaseEstimator, TransformerMixin):
         :param pop_clean: optional bin population cleanup phase
         :param report: list of integers, indicating iterations where the population will be printed out for viewing
         :param random_seed: the seed value needed to generate a random number
+        :param n_jobs: number of parallel processes used to evaluate bins (initial population, offspring each iteration, and Cox PH model fits) (-1 uses all available cores)
         :param verbose: Boolean flag to run in 'verbose' mode - display run details
         """
         # Basic run parameter checks
@@ -196,6 +202,9 @@ class FIBERS(BaseEstimator, TransformerMixin):
         if not self.check_is_int(random_seed) and not random_seed == None:
             raise Exception("'random_seed' param must be an int or None")
 
+        if not self.check_is_int(n_jobs) or n_jobs == 0:
+            raise Exception("'n_jobs' param must be a non-zero int (-1 uses all available cores)")
+
         if not verbose == True and not verbose == False and not verbose == 'True' and not verbose == 'False':
             raise Exception("'verbose' param must be a boolean, i.e. True or False")
         
@@ -231,6 +240,7 @@ class FIBERS(BaseEstimator, TransformerMixin):
         self.pop_clean = pop_clean
         self.report = report
         self.random_seed = random_seed
+        self.n_jobs = n_jobs
         self.verbose = verbose
         if self.covariates is None:
             self.covariates = list()
@@ -321,6 +331,7 @@ class FIBERS(BaseEstimator, TransformerMixin):
         # PREPARE DATA ---------------------------------------
         self.df = self.check_x_y(x, y)
         self.df,self.feature_names = prepare_data(self.df,self.outcome_label,self.censor_label,self.covariates)
+        self.df = compact_feature_columns(self.df,self.feature_names)
         if self.max_bin_size == None:
             self.max_bin_size = len(self.feature_names)
 
@@ -336,7 +347,7 @@ class FIBERS(BaseEstimator, TransformerMixin):
         self.set = BIN_SET(self.manual_bin_init,self.df,self.feature_names,self.pop_size,
                            self.min_bin_size,self.max_bin_init_size,self.group_thresh_list,self.min_thresh,self.max_thresh,
                            self.int_thresh,self.multi_thresholding,self.outcome_type,self.fitness_metric,self.log_rank_weighting,self.group_strata_min,
-                           self.outcome_label,self.censor_label,threshold_evolving,self.penalty,self.iterations,0,self.residuals,self.covariates,random)
+                           self.outcome_label,self.censor_label,threshold_evolving,self.penalty,self.iterations,0,self.residuals,self.covariates,random,self.n_jobs)
         #Global fitness update
         self.set.global_fitness_update(self.penalty) #Exerimental
 
@@ -366,15 +377,22 @@ class FIBERS(BaseEstimator, TransformerMixin):
 
             # GENETIC ALGORITHM
             target_offspring_count = int(self.pop_size*self.new_gen) #Determine number of offspring to generate
+            self.set.cache_selection_fitness()
+            self.set.index_bin_pop()
             while len(self.set.offspring_pop) < target_offspring_count: #Generate offspring until we hit the target number
                 # Parent Selection
                 parent_list = self.set.select_parent_pair(self.tournament_prop,random)
 
-                # Generate Offspring - clone, crossover, mutation, evaluation, add to population
-                self.set.generate_offspring(self.crossover_prob,mutation_prob,self.merge_prob,self.iterations,iteration,parent_list,self.feature_names,
-                                            threshold_evolving,self.multi_thresholding,self.min_bin_size,self.max_bin_size,self.max_bin_init_size,self.min_thresh,self.max_thresh,
-                                            self.df,self.outcome_type,self.fitness_metric,self.log_rank_weighting,self.outcome_label,self.censor_label,self.int_thresh,
-                                            self.group_thresh_list,self.group_strata_min,self.penalty,self.residuals,self.covariates,random)
+                # Generate Offspring - clone, crossover, mutation, add to offspring population
+                self.set.generate_offspring(self.crossover_prob,mutation_prob,self.merge_prob,iteration,parent_list,self.feature_names,threshold_evolving,
+                                            self.multi_thresholding,self.min_bin_size,self.max_bin_size,self.max_bin_init_size,self.min_thresh,self.max_thresh,random)
+
+                if len(self.set.offspring_pop) >= target_offspring_count:
+                    # Offspring evaluation of the full batch (parallelized over n_jobs) - offspring that became duplicates once evaluated are
+                    # removed, and the loop generates replacements for them
+                    self.set.evaluate_offspring(self.iterations,iteration,self.feature_names,threshold_evolving,self.multi_thresholding,self.min_thresh,self.max_thresh,
+                                                self.outcome_type,self.fitness_metric,self.int_thresh,
+                                                self.group_thresh_list,self.group_strata_min,self.penalty,self.n_jobs)
             # Add Offspring to Population
             self.set.add_offspring_into_pop(iteration)
 
@@ -442,20 +460,17 @@ class FIBERS(BaseEstimator, TransformerMixin):
             raise Exception("FIBERS must be fit first")
 
         # PREPARE DATA ---------------------------------------
-        df = self.check_x_y(x, y)
-        df,self.feature_names = prepare_data(df,self.outcome_label,self.censor_label,self.covariates)
-
-        tdf = pd.DataFrame()
-
-        #Create transformed dataset
-        bin_count = 0
-        for bin in self.set.bin_pop: #for each bin in the population - apply it to creating a bin 'feature' in the dataset for each instance
-            # Sum instance values across features specified in the bin
-            feature_sums = df[bin.feature_list].sum(axis=1)
-            tdf['Bin_'+str(bin_count)] = feature_sums
-            if not full_sums:
-                tdf['Bin_'+str(bin_count)] = tdf['Bin_'+str(bin_count)].apply(lambda x: 0 if x <= bin.group_threshold else 1)
-            bin_count += 1
+        df = self.check_x_y(x, y) # Not re-cleaned with prepare_data() - bins only read their own features, and the trained feature_names are kept
+
+        #Create transformed dataset - each bin in the population becomes a bin 'feature' (i.e. value sums of bin-specified features) for each instance
+        feature_sums = bin_feature_sums(df,self.set.bin_pop)
+        if not full_sums:
+            # Assign each instance to its bin group (0 = at/below low threshold, 1 = between thresholds, 2 = above high threshold)
+            bin_groups = np.empty(feature_sums.shape,dtype=np.int64)
+            for bin_index, bin in enumerate(self.set.bin_pop):
+                bin_groups[:,bin_index] = np.searchsorted(bin.group_threshold_list,feature_sums[:,bin_index],side='left')
+            feature_sums = bin_groups
+        tdf = pd.DataFrame(feature_sums,columns=['Bin_'+str(i) for i in range(len(self.set.bin_pop))],index=df.index)
 
         tdf = pd.concat([tdf,df.loc[:,self.outcome_label],df.loc[:,self.censor_label]],axis=1)
         df = None
@@ -496,19 +511,17 @@ class FIBERS(BaseEstimator, TransformerMixin):
         # Make Predition
         if bin_number != None: #Make prediction with single selected bin
             # Sum instance values across features specified in the bin
-            feature_sums = df[self.set.bin_pop[bin_number].feature_list].sum(axis=1)
-            prediction_list = (df[self.set.bin_pop[bin_number].feature_list].sum(axis=1) > self.set.bin_pop[bin_number].group_threshold).astype(int).values
+            bin = self.set.bin_pop[bin_number]
+            feature_sums = df[bin.feature_list].sum(axis=1).to_numpy()
+            # High strata (1) are instances above the bin's high threshold, as in the population vote below
+            prediction_list = (feature_sums > bin.group_threshold_list[-1]).astype(int)
             df = None
             return np.array(prediction_list) 
         
         else: #Make prediction using entire bin population (weighted voting scheme)
-            temp_df = pd.DataFrame()
-            bin_count = 0
-            for bin in self.set.bin_pop: #for each bin in the population 
-                # Sum instance values across features specified in the bin
-                feature_sums = df[bin.feature_list].sum(axis=1)
-                temp_df['Bin_'+str(bin_count)] = feature_sums
-                bin_count += 1
+            # Sum instance values across features specified in each bin of the population
+            feature_sums = bin_feature_sums(df,self.set.bin_pop)
+            temp_df = pd.DataFrame(feature_sums,columns=['Bin_'+str(i) for i in range(len(self.set.bin_pop))],index=df.index)
 
             # Count
             bt_vote = [0]*len(temp_df) #votesum stored for each instance
@@ -607,11 +620,10 @@ class FIBERS(BaseEstimator, TransformerMixin):
 
         # PREPARE DATA ---------------------------------------
         df = self.check_x_y(x, y)
-        df,self.feature_names = prepare_data(df,self.outcome_label,self.censor_label,self.covariates)
         # print(df.shape)
 
         # Sum instance values across features specified in the bin
-        feature_sums = df.loc[:,self.feature_names][self.set.bin_pop[bin_index].feature_list].sum(axis=1)
+        feature_sums = df[self.set.bin_pop[bin_index].feature_list].sum(axis=1)
         bin_df = pd.DataFrame({'Bin_'+str(bin_index):feature_sums})
 
         # Create evaluation dataframe including bin sum feature with 
@@ -649,10 +661,9 @@ class FIBERS(BaseEstimator, TransformerMixin):
         
         # PREPARE DATA ---------------------------------------
         df = self.check_x_y(x, y)
-        df,self.feature_names = prepare_data(df,self.outcome_label,self.censor_label,self.covariates)
 
         # Sum instance values across features specified in the bin
-        feature_sums = df.loc[:,self.feature_names][self.set.bin_pop[bin_index].feature_list].sum(axis=1)
+        feature_sums = df[self.set.bin_pop[bin_index].feature_list].sum(axis=1)
         bin_df = pd.DataFrame({'Bin_'+str(bin_index):feature_sums})
 
         if not use_bin_sums:
@@ -683,10 +694,9 @@ class FIBERS(BaseEstimator, TransformerMixin):
 
         # PREPARE DATA ---------------------------------------
         df = self.check_x_y(x, y)
-        df,self.feature_names = prepare_data(df,self.outcome_label,self.censor_label,self.covariates)
 
         # Sum instance values across features specified in the bin
-        feature_sums = df.loc[:,self.feature_names][self.set.bin_pop[bin_index].feature_list].sum(axis=1)
+        feature_sums = df[self.set.bin_pop[bin_index].feature_list].sum(axis=1)
         bin_df = pd.DataFrame({'Bin_'+str(bin_index):feature_sums})
 
         if not use_bin_sums:
@@ -718,10 +728,9 @@ class FIBERS(BaseEstimator, TransformerMixin):
 
         # PREPARE DATA ---------------------------------------
         df = self.check_x_y(x, y)
-        df,self.feature_names = prepare_data(df,self.outcome_label,self.censor_label,self.covariates)
 
         # Sum instance values across features specified in the bin
-        feature_sums = df.loc[:,self.feature_names][self.set.bin_pop[bin_index].feature_list].sum(axis=1)
+        feature_sums = df[self.set.bin_pop[bin_index].feature_list].sum(axis=1)
         bin_df = pd.DataFrame({'Bin_'+str(bin_index):feature_sums})
 
         if not use_bin_sums:
@@ -764,47 +773,41 @@ class FIBERS(BaseEstimator, TransformerMixin):
         
         # PREPARE DATA ---------------------------------------
         df = self.check_x_y(x, y)
-        df,self.feature_names = prepare_data(df,self.outcome_label,self.censor_label,self.covariates)
-        bin_index = 0
-        for bin in self.set.bin_pop: #For each bin in population
-
-            # Sum instance values across features specified in the bin
-            feature_sums = df.loc[:,self.feature_names][bin.feature_list].sum(axis=1)
-            bin_df = pd.DataFrame({'Bin':feature_sums})
-
-            if not use_bin_sums:
-                # Transform bin feature values according to respective bin threshold
-                bin_df['Bin'] = bin_df['Bin'].apply(
-                lambda x: 0 if x <= bin.group_threshold_list[0] else 
-                          (1 if x <= bin.group_threshold_list[1] else 2))
-
-            # Create evaluation dataframe including bin sum feature, outcome, and censoring alone
-            bin_df = pd.concat([bin_df,df.loc[:,self.outcome_label],df.loc[:,self.censor_label]],axis=1)
+        # Sum instance values across features specified in each bin of the population (one preallocated bins array)
+        bin_values = bin_feature_sums(df,self.set.bin_pop)
+        if not use_bin_sums:
+            # Transform bin feature values according to respective bin thresholds
+            for bin_index, bin in enumerate(self.set.bin_pop):
+                bin_values[:,bin_index] = np.searchsorted(bin.group_threshold_list,bin_values[:,bin_index],side='left')
+
+        # Create evaluation dataframes once (bin column first) - each bin only replaces the bin column
+        bin_df = pd.concat([pd.DataFrame({'Bin':bin_values[:,0]},index=df.index),df.loc[:,self.outcome_label],df.loc[:,self.censor_label]],axis=1)
+        if self.covariates != None:
+            adj_bin_df = pd.concat([bin_df,df.loc[:,self.covariates]],axis=1)
+            # The covariate-only fit is shared by all bins - its coefficients warm start every adjusted fit (bin coefficient starts at 0)
             try:
-                summary = cox_prop_hazard(bin_df,self.outcome_label,self.censor_label)
-                bin.HR = summary['exp(coef)'].iloc[0]
-                bin.HR_CI = str(summary['exp(coef) lower 95%'].iloc[0])+'-'+str(summary['exp(coef) upper 95%'].iloc[0])
-                bin.HR_p_value = summary['p'].iloc[0]
+                adj_initial_point = np.concatenate(([0.0],covariate_cox_coefficients(df,self.covariates,self.outcome_label,self.censor_label)))
             except:
-                bin.HR = 0
-                bin.HR_CI = None
-                bin.HR_p_value = None
-
-            # Create evaluation dataframe including bin sum feature with covariates
-            if self.covariates != None:                 
-                try:
-                    bin_df = pd.concat([bin_df,df.loc[:,self.covariates]],axis=1)
-                    summary = cox_prop_hazard(bin_df,self.outcome_label,self.censor_label)
-                    bin.adj_HR = summary['exp(coef)'].iloc[0]
-                    bin.adj_HR_CI = str(summary['exp(coef) lower 95%'].iloc[0])+'-'+str(summary['exp(coef) upper 95%'].iloc[0])
-                    bin.adj_HR_p_value = summary['p'].iloc[0]
-                except:
-                    bin.adj_HR = 0
-                    bin.adj_HR_CI = None
-                    bin.adj_HR_p_value = None
-            # print('Evaluating Bin '+str(bin_index))
-            bin_index += 1
-
+                adj_initial_point = None
+
+        # Evaluate bin sum feature, outcome, and censoring alone (bins are independent, so they are fit in parallel when n_jobs != 1)
+        hazard_ratios = Parallel(n_jobs=self.n_jobs)(delayed(bin_cox_prop_hazard)(bin_values[:,bin_index],bin_df,self.outcome_label,self.censor_label)
+                                                     for bin_index in range(len(self.set.bin_pop)))
+        for bin, (HR, HR_CI, HR_p_value) in zip(self.set.bin_pop,hazard_ratios):
+            bin.HR = HR
+            bin.HR_CI = HR_CI
+            bin.HR_p_value = HR_p_value
+
+        # Evaluate bin sum feature with covariates
+        if self.covariates != None:
+            adj_hazard_ratios = Parallel(n_jobs=self.n_jobs)(delayed(bin_cox_prop_hazard)(bin_values[:,bin_index],adj_bin_df,self.outcome_label,self.censor_label,adj_initial_point)
+                                                             for bin_index in range(len(self.set.bin_pop)))
+            for bin, (adj_HR, adj_HR_CI, adj_HR_p_value) in zip(self.set.bin_pop,adj_hazard_ratios):
+                bin.adj_HR = adj_HR
+                bin.adj_HR_CI = adj_HR_CI
+                bin.adj_HR_p_value = adj_HR_p_value
+
+        adj_bin_df = None
         bin_df = None
 
     def get_bin_report(self, bin_index):
@@ -909,4 +912,5 @@ class FIBERS(BaseEstimator, TransformerMixin):
             file.write(f"pop_clean: {self.pop_clean}\n")
             file.write(f"report: {self.report}\n")
             file.write(f"random_seed: {self.random_seed}\n")
+            file.write(f"n_jobs: {self.n_jobs}\n")
             file.write(f"verbose: {self.verbose}\n")
\ No newline at end of file
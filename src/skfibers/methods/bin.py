@@ -3,9 +3,38 @@ import pandas as pd
 import copy
 from lifelines import CoxPHFitter
 from lifelines.statistics import logrank_test
-from lifelines.statistics import multivariate_logrank_test
+from .logrank import threshold_logrank_tests
 from scipy.stats import ranksums
-from scipy.stats import kruskal
+from scipy.special import chdtrc
+from bisect import insort
+
+
+class FeatureComplement:
+    # Features (in dataset order) that are not specified in a bin, indexed without building the list - random.choice() draws the same
+    # feature from it as from the full list, and features entering or leaving the bin only update the sorted bin positions
+    def __init__(self,feature_names,feature_index,feature_list):
+        self.feature_names = feature_names
+        self.feature_index = feature_index
+        self.bin_positions = sorted({feature_index[feature] for feature in feature_list})
+
+    def __len__(self):
+        return len(self.feature_names) - len(self.bin_positions)
+
+    def __getitem__(self,index):
+        # Skip past every bin feature at or before the candidate position
+        position = index
+        for bin_position in self.bin_positions:
+            if bin_position > position:
+                break
+            position += 1
+        return self.feature_names[position]
+
+    def add_to_bin(self,feature): # Feature leaves the complement
+        insort(self.bin_positions,self.feature_index[feature])
+
+    def remove_from_bin(self,feature): # Feature re-enters the complement
+        self.bin_positions.remove(self.feature_index[feature])
+
 
 class BIN:
     def __init__(self):
@@ -57,15 +86,15 @@ class BIN:
                 self.group_threshold_list.sort()
     
 
-    def initialize_manual(self,feature_names,loaded_bin,loaded_thresh_list,low_thresh,high_thresh,min_thresh,max_thresh,birth_iteration):
+    def initialize_manual(self,feature_index,loaded_bin,loaded_thresh_list,low_thresh,high_thresh,min_thresh,max_thresh,birth_iteration):
         num_thresh = len(loaded_thresh_list)
         if birth_iteration == None:
             self.birth_iteration = 0
         else:
             self.birth_iteration = birth_iteration
-        for feature in loaded_bin:
+        for feature in dict.fromkeys(loaded_bin): # Repeated features are only added once (order preserved)
             #Initialize manual feature lists
-            if feature in feature_names:
+            if feature in feature_index: # Feature name -> position dict, so the check does not scan all feature names
                 self.feature_list.append(feature)
             else:
                 print("Warning: feature ("+str(feature)+") not found in dataset for manual bin initialization")
@@ -83,71 +112,46 @@ class BIN:
         self.bin_size = len(self.feature_list)
 
 
-    def evaluate(self,feature_df,outcome_df,censor_df,outcome_type,fitness_metric,log_rank_weighting,outcome_label,
-                 censor_label,min_thresh,max_thresh,int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residuals,covariate_df):
-        # Sum instance values across features specified in the bin
-        feature_sums = feature_df[self.feature_list].sum(axis=1)
-        bin_df = pd.DataFrame({'feature_sum':feature_sums})
-
-        # Create evaluation dataframe including bin sum feature with
-        bin_df = pd.concat([bin_df,outcome_df,censor_df],axis=1)
+    def evaluate(self,feature_sums,log_rank_risk_set,outcome_type,fitness_metric,
+                 min_thresh,max_thresh,int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residual_ranks,residual_tie_correction):
+        # feature_sums: instance values summed across the bin's features; log_rank_risk_set (logrank_risk_set() of the outcome) and residual_ranks (of the deviance residuals) are aligned with it
+        if self.adaptive_thresholding(group_thresh_list,threshold_evolving,iterations,iteration): #Adaptive thresholding activated (always applied on last iteration)
+            # Select best thresholds by evaluating all considered (multi-thresholds first, then single thresholds)
+            threshold_lists = []
+            if multi_thresholding:
+                threshold_lists += [[low_thresh, high_thresh] for low_thresh in range(min_thresh, max_thresh) for high_thresh in range(low_thresh + 1, max_thresh + 1)]
+            threshold_lists += [[low_thresh] for low_thresh in range(min_thresh, max_thresh + 1)]
+            log_rank_tests = self.log_rank_tests(threshold_lists,feature_sums,log_rank_risk_set,fitness_metric)
 
-        if (group_thresh_list is None) and (not threshold_evolving or iteration == iterations-1): #Adaptive thresholding activated (always applied on last iteration)
-            # Select best thresholds by evaluating all considered
             best_score = None
             thresh_score = 0
-            if multi_thresholding:
-                for low_thresh in range(min_thresh, max_thresh):
-                        for high_thresh in range(low_thresh + 1, max_thresh + 1):
-                            log_rank_score, p_value,residuals_score,residuals_p_value,count_bt,count_mt,count_at = self.evaluate_for_thresholds([low_thresh, high_thresh],bin_df,outcome_label,censor_label,
-                                                                                                                                    outcome_type,fitness_metric, log_rank_weighting,residuals,covariate_df)
-                            if fitness_metric == 'log_rank':
-                                thresh_score = log_rank_score
-
-                            elif fitness_metric == 'residuals': 
-                                thresh_score = residuals_score
-
-                            elif fitness_metric == 'log_rank_residuals':
-                                thresh_score = log_rank_score * residuals_score
-
-                            if best_score is None or thresh_score > best_score:
-                                self.log_rank_score = log_rank_score
-                                self.log_rank_p_value = p_value
-                                self.residuals_score = residuals_score
-                                self.residuals_p_value = residuals_p_value
-                                self.group_threshold_list = [low_thresh, high_thresh]
-                                self.count_bt= count_bt
-                                self.count_mt = count_mt
-                                self.count_at = count_at
-                                best_score = thresh_score
-                            
-            for low_thresh in range(min_thresh, max_thresh + 1):
-                        log_rank_score, p_value,residuals_score,residuals_p_value,count_bt,count_mt,count_at = self.evaluate_for_thresholds([low_thresh],bin_df,outcome_label,censor_label,
-                                                                                                                                outcome_type,fitness_metric, log_rank_weighting,residuals,covariate_df)
-                        if fitness_metric == 'log_rank':
-                            thresh_score = log_rank_score
-
-                        elif fitness_metric == 'residuals': 
-                            thresh_score = residuals_score
-
-                        elif fitness_metric == 'log_rank_residuals':
-                            thresh_score = log_rank_score * residuals_score
-
-                        if best_score is None or thresh_score > best_score:
-                            self.log_rank_score = log_rank_score
-                            self.log_rank_p_value = p_value
-                            self.residuals_score = residuals_score
-                            self.residuals_p_value = residuals_p_value
-                            self.group_threshold_list = [low_thresh]
-                            self.count_bt= count_bt
-                            self.count_mt = count_mt
-                            self.count_at = count_at
-                            best_score = thresh_score
+            for thresh_list, log_rank_test in zip(threshold_lists, log_rank_tests):
+                log_rank_score, p_value,residuals_score,residuals_p_value,count_bt,count_mt,count_at = self.evaluate_for_thresholds(thresh_list,feature_sums,outcome_type,
+                                                                                                                        fitness_metric,residual_ranks,residual_tie_correction,log_rank_test)
+                if fitness_metric == 'log_rank':
+                    thresh_score = log_rank_score
+
+                elif fitness_metric == 'residuals': 
+                    thresh_score = residuals_score
+
+                elif fitness_metric == 'log_rank_residuals':
+                    thresh_score = log_rank_score * residuals_score
+
+                if best_score is None or thresh_score > best_score:
+                    self.log_rank_score = log_rank_score
+                    self.log_rank_p_value = p_value
+                    self.residuals_score = residuals_score
+                    self.residuals_p_value = residuals_p_value
+                    self.group_threshold_list = thresh_list
+                    self.count_bt= count_bt
+                    self.count_mt = count_mt
+                    self.count_at = count_at
+                    best_score = thresh_score
 
         else: #Use the given group threshold to evaluate the bin
-            # low_thresh, high_thresh = self.group_threshold_list
-            log_rank_score,p_value,residuals_score,residuals_p_value,count_bt,count_mt,count_at = self.evaluate_for_thresholds(self.group_threshold_list,bin_df,outcome_label,censor_label,outcome_type,
-                                                                                                                              fitness_metric,log_rank_weighting,residuals,covariate_df)
+            log_rank_test = self.log_rank_tests([self.group_threshold_list],feature_sums,log_rank_risk_set,fitness_metric)[0]
+            log_rank_score,p_value,residuals_score,residuals_p_value,count_bt,count_mt,count_at = self.evaluate_for_thresholds(self.group_threshold_list,feature_sums,outcome_type,
+                                                                                                                              fitness_metric,residual_ranks,residual_tie_correction,log_rank_test)
             self.log_rank_score = log_rank_score
             self.log_rank_p_value = p_value
             self.residuals_score = residuals_score
@@ -160,7 +164,52 @@ class BIN:
         self.bin_size = len(self.feature_list)
 
 
-    def evaluate_for_thresholds(self,group_thresh_list,bin_df,outcome_label,censor_label,outcome_type,fitness_metric,log_rank_weighting,residuals,covariate_df):
+    @staticmethod
+    def adaptive_thresholding(group_thresh_list,threshold_evolving,iterations,iteration):
+        # Whether evaluation searches all thresholds (rather than scoring the bin's current thresholds)
+        return (group_thresh_list is None) and (not threshold_evolving or iteration == iterations-1)
+
+
+    @staticmethod
+    def kruskal_wallis(ranks,groups,tie_correction):
+        # Kruskal-Wallis test (as scipy's kruskal) from ranks precomputed over all instances - groups are boolean masks that partition them
+        total = len(ranks)
+        ssbn = sum(ranks[group].sum()**2 / np.count_nonzero(group) for group in groups)
+        statistic = 12.0 / (total * (total + 1)) * ssbn - 3 * (total + 1)
+        statistic /= tie_correction
+        return statistic, chdtrc(len(groups) - 1,statistic)
+
+
+    def evaluation_key(self,adaptive):
+        # Evaluation results only depend on the bin's features, and on its thresholds unless they are being searched
+        if adaptive:
+            return (frozenset(self.feature_list), None)
+        return (frozenset(self.feature_list), tuple(self.group_threshold_list))
+
+
+    def get_evaluation(self):
+        return (self.log_rank_score,self.log_rank_p_value,self.residuals_score,self.residuals_p_value,list(self.group_threshold_list),
+                self.count_bt,self.count_mt,self.count_at)
+
+
+    def load_evaluation(self,evaluation):
+        # Restore results stored by get_evaluation() in place of evaluate()
+        self.log_rank_score,self.log_rank_p_value,self.residuals_score,self.residuals_p_value,group_threshold_list,self.count_bt,self.count_mt,self.count_at = evaluation
+        self.group_threshold_list = list(group_threshold_list)
+        self.bin_size = len(self.feature_list)
+
+
+    def log_rank_tests(self,threshold_lists,feature_sums,log_rank_risk_set,fitness_metric):
+        # Log-rank (test_statistic, p_value) of the strata-groups made by each threshold list, from one risk table of the bin (None where the test fails)
+        if (fitness_metric != 'log_rank' and fitness_metric != 'log_rank_residuals') or log_rank_risk_set is None:
+            return [None] * len(threshold_lists)
+        try:
+            return threshold_logrank_tests(feature_sums,log_rank_risk_set,threshold_lists)
+        except:
+            return [None] * len(threshold_lists)
+
+
+    def evaluate_for_thresholds(self,group_thresh_list,feature_sums,outcome_type,fitness_metric,residual_ranks,residual_tie_correction,log_rank_test=None):
         # Apply selected evaluation strategy/metric(s)
         low_thresh = None
         high_thresh = None
@@ -180,75 +229,39 @@ class BIN:
             count_at = None
 
             if fitness_metric == 'log_rank' or fitness_metric == 'log_rank_residuals':
-                #Create dataframes including instances from either strata-groups
-                low_df = bin_df[bin_df['feature_sum'] <= low_thresh]
-                if num_thresh == 2:
-                    mid_df = bin_df[(bin_df['feature_sum'] > low_thresh) & (bin_df['feature_sum'] <= high_thresh)]
-                    high_df = bin_df[bin_df['feature_sum'] > high_thresh]
-                else: 
-                    high_df = bin_df[bin_df['feature_sum'] > low_thresh]
-                
-                low_outcome = low_df[outcome_label].to_list()
-                # mid_outcome = mid_df[outcome_label].to_list()
-                high_outcome = high_df[outcome_label].to_list()
-                
-                low_censor = low_df[censor_label].to_list()
-                # mid_censor = mid_df[censor_label].to_list()
-                high_censor = high_df[censor_label].to_list()
-                
-                count_bt = len(low_outcome)
-                # count_mt = len(mid_outcome)
-                count_at = len(high_outcome)
-
+                # Strata-group sizes (the log-rank test itself is run for all threshold lists at once by log_rank_tests())
+                count_bt = int(np.count_nonzero(feature_sums <= low_thresh))
                 if num_thresh == 2:
-                    mid_outcome = mid_df[outcome_label].to_list()
-                    mid_censor = mid_df[censor_label].to_list()
-                    count_mt = len(mid_outcome)
-                    
-                    combined_outcomes = low_outcome + mid_outcome + high_outcome # event_durations for all individuals
-                    combined_groups = [0] * len(low_outcome) + [1] * len(mid_outcome)  + [2] * len(high_outcome) # Assign group 0 to low_outcome and group 1 to high_outcome (group labels for each individual)
-                    combined_censors = low_censor + mid_censor + high_censor # event_observed (censoring) for all individuals
-                    
+                    count_at = int(np.count_nonzero(feature_sums > high_thresh))
+                    count_mt = len(feature_sums) - count_bt - count_at
                 else:
                     count_mt = 0
-                    combined_outcomes = low_outcome + high_outcome
-                    combined_groups = [0] * len(low_outcome) + [1] * len(high_outcome)
-                    combined_censors = low_censor + high_censor
-
-                try:
-                    # results = logrank_test(low_outcome, high_outcome, event_observed_A=low_censor,event_observed_B=high_censor,weightings=log_rank_weighting)
-                    results = multivariate_logrank_test(combined_outcomes, combined_groups, event_observed=combined_censors, weightings=log_rank_weighting)
-                    log_rank_score = results.test_statistic #test all thresholds by default in initial pop.
-                    p_value = results.p_value
-                except:
+                    count_at = len(feature_sums) - count_bt
+
+                if log_rank_test is None: # Test could not be run for these groups
                     log_rank_score = 0
                     p_value = None
+                else:
+                    log_rank_score, p_value = log_rank_test
 
             if fitness_metric == 'residuals' or fitness_metric == 'log_rank_residuals': # In addition to log_rank, calculate residuals differences between groups
-                low_residuals_df = residuals.loc[bin_df['feature_sum'] <= low_thresh] #Does the threshold work the same way since these are residual? Transformed?
-                mid_residuals_df = residuals.loc[(bin_df['feature_sum'] > low_thresh) & (bin_df['feature_sum'] <= high_thresh)]
-                high_residuals_df = residuals.loc[bin_df['feature_sum'] > high_thresh] # or is the residuals data the same and only the duration changed?
-                
-                low_residuals_df = low_residuals_df["deviance"]
-                mid_residuals_df = mid_residuals_df["deviance"]
-                high_residuals_df = high_residuals_df["deviance"]
-
-                count_bt = len(low_residuals_df)
-                count_mt = len(mid_residuals_df)
-                count_at = len(high_residuals_df)
-
-                if len(low_residuals_df) == 0 or len(mid_residuals_df) == 0 or len(high_residuals_df) == 0:
+                low_group = feature_sums <= low_thresh #Does the threshold work the same way since these are residual? Transformed?
+                if num_thresh == 2:
+                    high_group = feature_sums > high_thresh # or is the residuals data the same and only the duration changed?
+                    mid_group = ~low_group & ~high_group
+                else: # Without a high threshold, no instance falls in the mid or high residual groups
+                    mid_group = np.zeros(len(feature_sums),dtype=bool)
+                    high_group = mid_group
+                count_bt = int(np.count_nonzero(low_group))
+                count_mt = int(np.count_nonzero(mid_group))
+                count_at = int(np.count_nonzero(high_group))
+
+                if count_bt == 0 or count_mt == 0 or count_at == 0 or residual_tie_correction == 0: # Test undefined (empty group or all residuals tied)
                     residuals_score = 0
                     residuals_p_value = None
                 else:
-                    try:
-                        # results = ranksums(low_residuals_df, high_residuals_df)
-                        results = kruskal(low_residuals_df, mid_residuals_df, high_residuals_df)
-                        residuals_score = abs(results.statistic)
-                        residuals_p_value = results.pvalue
-                    except:
-                        residuals_score = 0
-                        residuals_p_value = None
+                    statistic, residuals_p_value = self.kruskal_wallis(residual_ranks,(low_group,mid_group,high_group),residual_tie_correction)
+                    residuals_score = abs(statistic)
 
         elif outcome_type == 'class':
             print("Classification not yet implemented")
@@ -273,14 +286,14 @@ class BIN:
         unique_to_list2 = set2 - set1
         unique_features = list(sorted(unique_to_list1.union(unique_to_list2)))
 
-        for feature in unique_features:
-            if random.random() < crossover_prob:
-                if feature in self.feature_list:
-                    self.feature_list.remove(feature)
-                    other_offspring.feature_list.append(feature)
-                else:
-                    other_offspring.feature_list.remove(feature)
-                    self.feature_list.append(feature)
+        # Draw all crossover decisions in one pass, then rebuild both feature lists (rather than list removals feature by feature)
+        swapped = [feature for feature in unique_features if random.random() < crossover_prob]
+        if swapped:
+            swapped_set = set(swapped)
+            to_self = [feature for feature in swapped if feature in unique_to_list2]
+            to_other = [feature for feature in swapped if feature in unique_to_list1]
+            self.feature_list = [feature for feature in self.feature_list if feature not in swapped_set] + to_self
+            other_offspring.feature_list = [feature for feature in other_offspring.feature_list if feature not in swapped_set] + to_other
 
         def crossover_threshold(threshold_list1, threshold_list2, crossover_prob, max_thresh, random):
             set1_th = set(threshold_list1)
@@ -329,7 +342,7 @@ class BIN:
                     other_offspring.group_threshold_list[0] = temp
 
 
-    def mutation(self,mutation_prob,feature_names,min_bin_size,max_bin_size,max_bin_init_size,threshold_evolving,multi_thresholding,min_thresh,max_thresh,random):
+    def mutation(self,mutation_prob,feature_names,feature_index,min_bin_size,max_bin_size,max_bin_init_size,threshold_evolving,multi_thresholding,min_thresh,max_thresh,random):
         self.feature_list = sorted(self.feature_list)
 
         if len(self.feature_list) == 0: #Initialize new bin if empty after crossover
@@ -338,40 +351,49 @@ class BIN:
             
 
         elif len(self.feature_list) == 1: # Addition and Swap Only (to avoid empy bins)
+            other_features = self.features_not_in_bin(feature_names,feature_index) # Kept in sync with the bin as features are added or removed
             for feature in self.feature_list:
                 if random.random() < mutation_prob:
-                    other_features = [value for value in feature_names if value not in self.feature_list] #pick a feature not already in the bin
-                    random_feature = random.choice(other_features)
+                    random_feature = random.choice(other_features) #pick a feature not already in the bin
                     if random.random() < 0.5: # Swap
                         self.feature_list.remove(feature)
+                        other_features.remove_from_bin(feature)
                         self.feature_list.append(random_feature)
+                        other_features.add_to_bin(random_feature)
                     else: # Addition
                         if len(self.feature_list) < max_bin_size:
                             self.feature_list.append(random_feature)
+                            other_features.add_to_bin(random_feature)
             # Enforce minimum bin size
             while len(self.feature_list) < min_bin_size: 
-                other_features = [value for value in feature_names if value not in self.feature_list] #pick a feature not already in the bin
-                self.feature_list.append(random.choice(other_features))
+                random_feature = random.choice(other_features) #pick a feature not already in the bin
+                self.feature_list.append(random_feature)
+                other_features.add_to_bin(random_feature)
 
         else: # Addition, Deletion, or Swap
             mutate_options = ['A','D','S'] #Add, delete, swap
+            other_features = self.features_not_in_bin(feature_names,feature_index) # Kept in sync with the bin as features are added or removed
             for feature in self.feature_list:
                 if random.random() < mutation_prob:
                     mutate_type = random.choice(mutate_options)
                     if mutate_type == 'D' or len(feature_names) == len(self.feature_list): # Deletion - also if bin (i.e. feature_list) is at the maximum possible size
                         self.feature_list.remove(feature)
+                        other_features.remove_from_bin(feature)
                     else:
-                        other_features = [value for value in feature_names if value not in self.feature_list] #pick a feature not already in the bin
-                        random_feature = random.choice(other_features)
+                        random_feature = random.choice(other_features) #pick a feature not already in the bin
                         if mutate_type == 'S': # Swap
                             self.feature_list.remove(feature)
+                            other_features.remove_from_bin(feature)
                             self.feature_list.append(random_feature)
+                            other_features.add_to_bin(random_feature)
                         elif mutate_type == 'A': # Addition
                             self.feature_list.append(random_feature)
+                            other_features.add_to_bin(random_feature)
             # Enforce minimum bin size
             while len(self.feature_list) < min_bin_size:
-                other_features = [value for value in feature_names if value not in self.feature_list] #pick a feature not already in the bin
-                self.feature_list.append(random.choice(other_features))
+                random_feature = random.choice(other_features) #pick a feature not already in the bin
+                self.feature_list.append(random_feature)
+                other_features.add_to_bin(random_feature)
             # Enforce maximum bin size
             while len(self.feature_list) > max_bin_size:
                 self.feature_list.remove(random.choice(self.feature_list))
@@ -404,15 +426,19 @@ class BIN:
             self.group_threshold_list.sort()
 
 
+    def features_not_in_bin(self,feature_names,feature_index):
+        # Features (in dataset order) that are not already specified in the bin
+        return FeatureComplement(feature_names,feature_index,self.feature_list)
+
+
     def merge(self,other_parent,max_bin_size,threshold_evolving,multi_thresholding,max_thresh,random):
         # Merge feature lists of two parents
         # Create list of feature names unique to one list or another
         set1 = set(self.feature_list)
-        set2 = set(other_parent.feature_list)
         #unique_to_list1 = set1 - set2
-        unique_to_list2 = set2 - set1
+        unique_to_list2 = [feature for feature in other_parent.feature_list if feature not in set1] # Order preserved so merges are reproducible for a given random seed
         #unique_features = list(sorted(unique_to_list1.union(unique_to_list2)))
-        self.feature_list = self.feature_list + list(unique_to_list2) 
+        self.feature_list = list(dict.fromkeys(self.feature_list + unique_to_list2))
         #self.feature_list = unique_features
         #Enforce maximum bin size
         while len(self.feature_list) > max_bin_size:
@@ -494,13 +520,14 @@ class BIN:
         self.bin_size = len(self.feature_list)
 
 
+    def bin_key(self):
+        # Hashable bin signature - membership of features and group thresholds, independent of order
+        return (frozenset(self.feature_list), frozenset(self.group_threshold_list))
+
+
     def is_equivalent(self,other_bin):
         # Bin equivalence is based on 'feature_list' and 'group_threshold'
-        equivalent = False
-        if set(self.group_threshold_list) == set(other_bin.group_threshold_list): #Same group threshold
-            if sorted(self.feature_list) == sorted(other_bin.feature_list):
-                equivalent = True
-        return equivalent
+        return self.bin_key() == other_bin.bin_key()
     
 
     def bin_report(self):
@@ -1,36 +1,115 @@
 import logging
+import numpy as np
+import pandas as pd
 from lifelines import CoxPHFitter
 
+INVARIANT_CHECK_BLOCK = 2**22 # Feature values copied at a time when checking for invariant columns (32 MB of float64)
+
+
 def prepare_data(df,outcome_label,censor_label,covariates):
     # Make list of feature names (i.e. columns that are not outcome, censor, or covariates)
     feature_names = list(df.columns)
     if covariates != None:
-        exclude = covariates + [outcome_label,censor_label]
+        exclude = set(covariates + [outcome_label,censor_label])
     else:
-        exclude = [outcome_label,censor_label]
+        exclude = {outcome_label,censor_label}
     feature_names = [item for item in feature_names if item not in exclude]
 
-    # Remove invariant feature columns (data cleaning)
+    # Remove invariant feature columns (data cleaning) - checked in blocks of columns, so the feature matrix is never copied whole
+    block_size = max(1,INVARIANT_CHECK_BLOCK // max(len(df),1))
     cols_to_drop = []
-    for col in feature_names:
-        if len(df[col].unique()) == 1:
-            cols_to_drop.append(col)
+    for start in range(0,len(feature_names),block_size):
+        block_names = feature_names[start:start+block_size]
+        invariant = invariant_columns(df.loc[:,block_names].to_numpy())
+        cols_to_drop.extend(col for col, is_invariant in zip(block_names,invariant) if is_invariant)
     df.drop(columns=cols_to_drop, inplace=True)
-    feature_names = [item for item in feature_names if item not in cols_to_drop]
+    dropped = set(cols_to_drop)
+    feature_names = [item for item in feature_names if item not in dropped]
     print("Dropped "+str(len(cols_to_drop))+" invariant feature columns.")
 
     return df, feature_names
 
 
+def invariant_columns(feature_array):
+    # Columns whose values all equal the first, as len(unique()) == 1 decides (all-NaN columns are invariant) - one column-wise pass
+    # instead of per-column unique()
+    if len(feature_array) == 0:
+        return np.zeros(feature_array.shape[1],dtype=bool)
+    invariant = (feature_array == feature_array[0]).all(axis=0)
+    first_missing = pd.isna(feature_array[0])
+    if first_missing.any(): # Only columns starting with NaN can be all-NaN
+        invariant[first_missing] = pd.isna(feature_array[:,first_missing]).all(axis=0)
+    return invariant
+
+
+def compact_feature_columns(df,feature_names):
+    # Store small integer-coded features (e.g. 0/1/2 genotypes) as int8 so bin summation and worker transfers move 8x less data
+    feature_array = df.loc[:,feature_names].to_numpy()
+    if feature_array.size == 0 or not np.issubdtype(feature_array.dtype,np.number):
+        return df
+    int8_info = np.iinfo(np.int8)
+    integral = np.issubdtype(feature_array.dtype,np.integer) or np.all(feature_array == np.round(feature_array))
+    if integral and feature_array.min() >= int8_info.min and feature_array.max() <= int8_info.max:
+        # Rebuilt block-wise from the already extracted array (a per-column astype is slow on wide data)
+        compact_df = pd.DataFrame(feature_array.astype(np.int8),index=df.index,columns=feature_names)
+        df = pd.concat([compact_df,df.drop(columns=feature_names)],axis=1).loc[:,df.columns]
+    return df
+
+
 def calculate_residuals(df,covariates,feature_names,outcome_label,censor_label): #Ryan - do we need to handle categorical variables like when calculating Cox PH??
     # Fit a Cox proportional hazards model to the DataFrame
     var_list = covariates+[outcome_label,censor_label]
+    var_df = df.loc[:,var_list] # Selected once - feature columns are never copied
     logging.info("Fitting COX Model")
     cph = CoxPHFitter()
-    cph.fit(df.loc[:,var_list], duration_col=outcome_label, event_col=censor_label, show_progress=True)
+    cph.fit(var_df, duration_col=outcome_label, event_col=censor_label, show_progress=True)
 
     # Calculate the residuals using the Schoenfeld residuals method
-    residuals = cph.compute_residuals(df.loc[:,var_list], kind='deviance')
+    residuals = cph.compute_residuals(var_df, kind='deviance')
     return residuals
 
 
+def covariate_cox_coefficients(df,covariates,outcome_label,censor_label):
+    # Coefficients of the covariate-only Cox model, scaled by covariate std (lifelines' initial_point space) - shared by every
+    # covariate-adjusted bin fit
+    var_df = df.loc[:,[outcome_label,censor_label]+covariates]
+    cph = CoxPHFitter()
+    cph.fit(var_df,outcome_label,event_col=censor_label,show_progress=False)
+    return (cph.params_ * var_df.loc[:,covariates].std(0)).loc[covariates].to_numpy()
+
+
+def bin_feature_sums(df,bin_pop):
+    # Sum instance values across the features of every bin (one positional column gather per bin) - only the features used by the bins are
+    # extracted from df, so trained models do not re-clean or copy the rest of the data
+    bin_features = list(dict.fromkeys(feature for bin in bin_pop for feature in bin.feature_list))
+    feature_index = {name: i for i, name in enumerate(bin_features)}
+    feature_array = df.loc[:,bin_features].to_numpy()
+    feature_sums = np.empty((len(feature_array),len(bin_pop)),dtype=feature_sum_dtype(feature_array))
+    for bin_index, bin in enumerate(bin_pop):
+        feature_sums[:,bin_index] = sum_features(feature_array,[feature_index[feature] for feature in bin.feature_list])
+    return feature_sums
+
+
+def sum_features(feature_array,columns,value_bound=None):
+    # Sum instance values across the given feature columns of feature_array (instances x features), in feature_sum_dtype()
+    return feature_array[:,columns].sum(axis=1,dtype=feature_sum_dtype(feature_array,len(columns),value_bound))
+
+
+def feature_sum_dtype(feature_array,bin_size=None,value_bound=None):
+    # Integer features are summed as integers and other features as float64. With value_bound (largest feature magnitude, see
+    # feature_value_bound()) the narrowest accumulator that cannot overflow for the bin size is used - int8 features of typical bins
+    # fit int16, which packs 4x more instances per vector instruction than int64 - otherwise int64, as pandas sums them
+    if feature_array.dtype.kind not in 'biu':
+        return np.float64
+    if value_bound is not None:
+        for dtype in (np.int16,np.int32):
+            if bin_size * value_bound <= np.iinfo(dtype).max:
+                return dtype
+    return np.result_type(np.int64,feature_array.dtype)
+
+
+def feature_value_bound(feature_array):
+    # Largest feature magnitude of integer features (bounds their bin sums), or None
+    if np.issubdtype(feature_array.dtype,np.integer) and feature_array.size > 0:
+        return max(-int(feature_array.min()),int(feature_array.max()))
+    return None
@@ -0,0 +1,94 @@
+import numpy as np
+from scipy.special import chdtrc
+
+
+def logrank_weights(at_risk,deaths,weightings):
+    # Per-time weights of the weighted log-rank alternatives (as in lifelines' multivariate_logrank_test)
+    if weightings is None:
+        return np.ones(len(at_risk))
+    if weightings == 'wilcoxon':
+        return at_risk.astype(np.float64)
+    if weightings == 'tarone-ware':
+        return np.sqrt(at_risk)
+    if weightings == 'peto':
+        return np.cumprod(1.0 - deaths / (at_risk + 1)) # Peto-Peto's modified survival estimates
+    raise ValueError("Invalid value for weightings.")
+
+
+def logrank_risk_set(durations,events,weightings=None):
+    # Everything in the log-rank test that only depends on the outcome (the time ordering and the pooled risk set), computed once per
+    # dataset and shared by every bin. Returns (expected, diagonal, event_time_index, weighted_factor)
+    _, time_index = np.unique(durations,return_inverse=True)
+    n_times = time_index.max() + 1
+    events = np.asarray(events).astype(bool)
+    n_i = np.cumsum(np.bincount(time_index,minlength=n_times)[::-1])[::-1] # Instances with a duration at or after each time
+    d_i = np.bincount(time_index,weights=events,minlength=n_times)
+    w_i = logrank_weights(n_i,d_i,weightings)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        factor = (n_i - d_i) / (n_i - 1)
+    factor[~np.isfinite(factor)] = 1
+    weighted_factor = w_i**2 * factor * d_i / n_i**2
+
+    # An instance is at risk at every time up to its own, so its share of the expected events (and of the diagonal of V) is a cumulative
+    # sum over time read at its duration
+    expected = events * w_i[time_index] - np.cumsum(w_i * d_i / n_i)[time_index]
+    diagonal = np.cumsum(weighted_factor * n_i)[time_index]
+    # Times without events add nothing to V, so the at-risk table of a bin is only needed at the event times - event_time_index is the
+    # number of event times at or before each instance's duration (it is at risk at all of them)
+    event_times = d_i > 0
+    event_time_index = np.cumsum(event_times)[time_index]
+    return expected, diagonal, event_time_index, weighted_factor[event_times]
+
+
+def threshold_logrank_tests(feature_sums,risk_set,threshold_lists):
+    # Multivariate log-rank test of the groups that each entry of threshold_lists makes of the bin feature sums
+    # (at/below the lowest threshold, between thresholds, above the highest threshold). Matches lifelines'
+    # multivariate_logrank_test, but the risk table of each distinct feature sum is built once and every grouping
+    # is a prefix-sum lookup into it. risk_set comes from logrank_risk_set() of the durations and events aligned with feature_sums.
+    # Returns (test_statistic, p_value) per entry, or None where lifelines would raise.
+    expected, diagonal, event_time_index, weighted_factor = risk_set
+    sum_values, value_index = np.unique(feature_sums,return_inverse=True)
+    n_values = len(sum_values)
+    n_event_times = len(weighted_factor)
+
+    # Z and V are sums over the feature sum values in each group, so their per-value terms are reduced over time once - every threshold
+    # list is then a prefix-sum lookup that never touches the time axis. z and a take a single pass over the instances, and only the
+    # value x value cross terms of V need the at-risk table
+    z = np.bincount(value_index,weights=expected,minlength=n_values)
+    a = np.bincount(value_index,weights=diagonal,minlength=n_values)
+    removed = np.bincount(value_index * (n_event_times + 1) + event_time_index,minlength=n_values*(n_event_times + 1)).reshape(n_values,n_event_times + 1)
+    at_risk = np.cumsum(removed[:,::-1],axis=1)[:,-2::-1] # Instances with a duration at or after each event time
+    cross = (at_risk * weighted_factor) @ at_risk.T
+
+    # Entry m holds the totals over the m lowest feature sum values
+    cum_z = np.concatenate(([0],np.cumsum(z)))
+    cum_a = np.concatenate(([0],np.cumsum(a)))
+    cum_count = np.concatenate(([0],np.cumsum(np.bincount(value_index,minlength=n_values))))
+    cum_cross = np.zeros((n_values + 1,n_values + 1))
+    cum_cross[1:,1:] = cross.cumsum(axis=0).cumsum(axis=1)
+
+    # Group boundaries (in sum value positions) for every threshold list - single thresholds get an empty middle group
+    low = np.searchsorted(sum_values,[thresholds[0] for thresholds in threshold_lists],side='right')
+    high = np.where([len(thresholds) == 2 for thresholds in threshold_lists],np.searchsorted(sum_values,[thresholds[-1] for thresholds in threshold_lists],side='right'),low)
+    cuts = np.stack((np.zeros_like(low),low,high,np.full_like(low,n_values)),axis=1)
+    start, stop = cuts[:,:-1], cuts[:,1:] # (thresholds, groups)
+    counts = cum_count[stop] - cum_count[start]
+
+    # Weighted observed minus expected events and their covariance, for all threshold lists at once
+    Z = cum_z[stop] - cum_z[start]
+    V = -(cum_cross[stop[:,:,None],stop[:,None,:]] - cum_cross[start[:,:,None],stop[:,None,:]]
+          - cum_cross[stop[:,:,None],start[:,None,:]] + cum_cross[start[:,:,None],start[:,None,:]])
+    V[:,np.arange(3),np.arange(3)] += cum_a[stop] - cum_a[start]
+
+    # lifelines tests all present groups but the last - masking the others out of Z and V leaves the pseudo-inverse of the
+    # tested block in place, so every threshold list is solved in one stacked call
+    present = counts > 0
+    tested = present.copy()
+    tested[np.arange(len(cuts)),2 - np.argmax(present[:,::-1],axis=1)] = False
+    Z_tested = Z * tested
+    V_tested = V * tested[:,:,None] * tested[:,None,:]
+    U = np.einsum('cg,cgh,ch->c',Z_tested,np.linalg.pinv(V_tested),Z_tested)
+    dof = present.sum(axis=1) - 1
+    p_values = np.where(dof > 0,chdtrc(dof,U),np.nan) # As chi2.sf, which is undefined without degrees of freedom
+    valid = np.abs(Z.sum(axis=1)) < 10e-8 # lifelines' own consistency check raises otherwise
+    return [(U[c],p_values[c]) if valid[c] else None for c in range(len(cuts))]
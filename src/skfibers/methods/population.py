@@ -6,21 +6,46 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import KMeans
 from .bin import BIN
+from .logrank import logrank_risk_set
+from .data_handling import sum_features, feature_value_bound
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy.stats import rankdata, tiecorrect
 import warnings
 
 
 class BIN_SET:
     def __init__(self,manual_bin_init,df,feature_names,pop_size,min_bin_size,max_bin_init_size,
                  group_thresh_list,min_thresh,max_thresh,int_thresh,multi_thresholding,outcome_type,fitness_metric,log_rank_weighting,group_strata_min,
-                 outcome_label,censor_label,threshold_evolving,penalty,iterations,iteration,residuals,covariates,random):
+                 outcome_label,censor_label,threshold_evolving,penalty,iterations,iteration,residuals,covariates,random,n_jobs=1):
         #Initialize bin population
         self.bin_pop = []
         self.offspring_pop = []
+        self.bin_pop_keys = set() # BIN.bin_key() of every bin in bin_pop - O(1) duplicate checks
+        self.offspring_keys = set() # BIN.bin_key() of every bin in offspring_pop
+        self.selection_fitness = [] # Fitness of each bin in bin_pop, cached for parent selection
+        self.evaluation_memo = {} # Evaluation results of every bin scored during the run (keyed on BIN.evaluation_key) - recreated bins are not re-scored
         self.feature_tracking = [0]*len(feature_names)
+        self.feature_index = {feature: index for index, feature in enumerate(feature_names)} # Position of each feature in feature_names/feature_tracking
+        self.feature_array = np.asfortranarray(df.loc[:,feature_names].to_numpy()) # Feature values (instances x features) extracted once - column-major so each bin's columns are contiguous
+        self.feature_value_bound = feature_value_bound(self.feature_array) # Bounds the bin sums, so they are accumulated in narrow integers
+        try:
+            # Time ordering and pooled risk set of the outcome, shared by the log-rank test of every bin
+            self.log_rank_risk_set = logrank_risk_set(df.loc[:,outcome_label].to_numpy(),df.loc[:,censor_label].to_numpy(),log_rank_weighting)
+        except ValueError: # Unsupported weighting - log-rank tests score 0
+            self.log_rank_risk_set = None
+        if residuals is None:
+            self.residual_ranks = None
+            self.residual_tie_correction = None
+        else:
+            # Residual scoring (Kruskal-Wallis) only depends on the ranks of the deviance residuals, which are shared by every bin
+            self.residual_ranks = rankdata(residuals['deviance'].reindex(df.index).to_numpy()) # Instance order
+            self.residual_tie_correction = tiecorrect(self.residual_ranks)
         # low_thresh = 2
         # high_thresh = 3
+        adaptive = BIN.adaptive_thresholding(group_thresh_list,threshold_evolving,iterations,iteration)
                 
         if isinstance(manual_bin_init, pd.DataFrame): # Load manually curated or previously trained bin population
+            loaded_bins = []
             for index, row in manual_bin_init.iterrows():
                 feature_text = row[0]
                 feature_list = eval(feature_text)
@@ -32,36 +57,48 @@ class BIN_SET:
                 new_bin = BIN()
                 low_thresh = loaded_thresh_low
                 high_thresh = loaded_thresh_high
-                new_bin.initialize_manual(feature_names,loaded_bin,loaded_thresh_list,low_thresh,high_thresh,min_thresh,max_thresh,birth_iteration)
-                # Bin metric score evaluation
-                new_bin.evaluate(df.loc[:,feature_names],df.loc[:,outcome_label],df.loc[:,censor_label],outcome_type,fitness_metric,log_rank_weighting,outcome_label,
-                                 censor_label,min_thresh,max_thresh,int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residuals,df.loc[:,covariates])
-                # Fitness metric calculation based on bin metric score
-                new_bin.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
+                new_bin.initialize_manual(self.feature_index,loaded_bin,loaded_thresh_list,low_thresh,high_thresh,min_thresh,max_thresh,birth_iteration)
+                loaded_bins.append(new_bin)
+            # Bin metric score evaluation and fitness metric calculation (in parallel when n_jobs != 1)
+            evaluated = self.evaluate_bins(loaded_bins,adaptive,outcome_type,fitness_metric,min_thresh,max_thresh,int_thresh,group_thresh_list,
+                                           threshold_evolving,multi_thresholding,iterations,iteration,group_strata_min,penalty,feature_names,n_jobs)
+            for new_bin in evaluated:
                 #Add new bin to population
                 self.bin_pop.append(new_bin)
+                self.bin_pop_keys.add(new_bin.bin_key())
 
-        #Random bin initialization
+        #Random bin initialization - bins are generated in batches, and each batch is evaluated in parallel (when n_jobs != 1)
         while len(self.bin_pop) < pop_size:
-            new_bin = BIN()
-            new_bin.initialize_random(feature_names,min_bin_size,max_bin_init_size,group_thresh_list,multi_thresholding,min_thresh,max_thresh,iteration,random)
-            # Check for duplicate rules based on feature list and threshold
-            while self.equivalent_bin_in_pop(new_bin,iteration): # May slow down evolutionary cycles if new bins aren't found right away
-                new_bin.random_bin(feature_names,min_bin_size,max_bin_init_size,random)
-            # Bin metric score evaluation
-            new_bin.evaluate(df.loc[:,feature_names],df.loc[:,outcome_label],df.loc[:,censor_label],outcome_type,fitness_metric,log_rank_weighting,outcome_label,
-                                censor_label,min_thresh,max_thresh,int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residuals,df.loc[:,covariates])
-            # Fitness metric calculation based on bin metric score
-            new_bin.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
-            #Add new bin to population
-            self.bin_pop.append(new_bin)
+            batch = []
+            batch_keys = set()
+            while len(self.bin_pop) + len(batch) < pop_size:
+                new_bin = BIN()
+                new_bin.initialize_random(feature_names,min_bin_size,max_bin_init_size,group_thresh_list,multi_thresholding,min_thresh,max_thresh,iteration,random)
+                # Check for duplicate rules based on feature list and threshold
+                while self.equivalent_bin_in_pop(new_bin,iteration) or new_bin.bin_key() in batch_keys: # May slow down evolutionary cycles if new bins aren't found right away
+                    new_bin.random_bin(feature_names,min_bin_size,max_bin_init_size,random)
+                batch.append(new_bin)
+                batch_keys.add(new_bin.bin_key())
+            # Bin metric score evaluation and fitness metric calculation
+            evaluated = self.evaluate_bins(batch,adaptive,outcome_type,fitness_metric,min_thresh,max_thresh,int_thresh,group_thresh_list,
+                                           threshold_evolving,multi_thresholding,iterations,iteration,group_strata_min,penalty,feature_names,n_jobs)
+            for new_bin in evaluated:
+                # Evaluation may select new thresholds, so re-check for duplicate bins (the batch is topped up on the next pass)
+                if not self.equivalent_bin_in_pop(new_bin,iteration):
+                    #Add new bin to population
+                    self.bin_pop.append(new_bin)
+                    self.bin_pop_keys.add(new_bin.bin_key())
+
+
+    def bin_feature_sums(self,bin):
+        # Sum instance values across the features specified in the bin (positional column gather, so workers only receive the sums)
+        return sum_features(self.feature_array,[self.feature_index[feature] for feature in bin.feature_list],self.feature_value_bound)
 
 
     def update_feature_tracking(self, feature_names):
         for bin in self.bin_pop:
             for feature in bin.feature_list:
-                index = feature_names.index(feature)
-                self.feature_tracking[index] += bin.pre_fitness
+                self.feature_tracking[self.feature_index[feature]] += bin.pre_fitness
 
 
     def custom_sort_key(self, obj):
@@ -69,7 +106,6 @@ class BIN_SET:
         
 
     def global_fitness_update(self,penalty):
-        self.bin_pop = sorted(self.bin_pop, key=self.custom_sort_key)
         # Sort bin population first by pre-fitness, then by group_theshold, then by bin_size, then by group_strata_prop (to form a global bin ranking)
         # Sort DataFrame by maximizing column A (descending) and minimizing column B (ascending) for ties
         decay = 0.2
@@ -93,7 +129,9 @@ class BIN_SET:
     def select_parent_pair(self,tournament_prop,random):
         #Tournament Selection
         #parent_list = [None, None]
-        tSize = int(len(self.bin_pop) * tournament_prop) #Tournament Size
+        if len(self.bin_pop) < 2: # No distinct second parent available
+            return [self.bin_pop[0],self.bin_pop[0]]
+        tSize = min(max(1,int(len(self.bin_pop) * tournament_prop)),len(self.bin_pop)-1) #Tournament Size (never the whole population, so a distinct second parent can always win)
         #currentCount = 0
         #while currentCount < 2:
         #    random.shuffle(self.bin_pop)
@@ -111,15 +149,20 @@ class BIN_SET:
 
     
 
+    def cache_selection_fitness(self):
+        # Bin fitness does not change while offspring are generated - look it up once per iteration for all tournaments
+        self.selection_fitness = [bin.fitness for bin in self.bin_pop]
+
+
     def tournament_selection(self,tSize,random):
-        random.shuffle(self.bin_pop)
-        new_parent = max(self.bin_pop[:tSize], key=lambda x: x.fitness)
+        # Draw tSize distinct bins (rather than shuffling the whole population) and return the fittest
+        tournament = random.sample(range(len(self.bin_pop)),tSize)
+        new_parent = self.bin_pop[max(tournament, key=self.selection_fitness.__getitem__)]
         return new_parent
 
 
-    def generate_offspring(self,crossover_prob,mutation_prob,merge_prob,iterations,iteration,parent_list,feature_names,threshold_evolving,multi_thresholding,
-                           min_bin_size,max_bin_size,max_bin_init_size,min_thresh,max_thresh,df,outcome_type,fitness_metric,log_rank_weighting,
-                           outcome_label,censor_label,int_thresh,group_thresh_list,group_strata_min,penalty,residuals,covariates,random):
+    def generate_offspring(self,crossover_prob,mutation_prob,merge_prob,iteration,parent_list,feature_names,threshold_evolving,multi_thresholding,
+                           min_bin_size,max_bin_size,max_bin_init_size,min_thresh,max_thresh,random):
         #print("Random Seed Check - genoff: "+ str(random.random()))
         # Clone Parents
         offspring_1 = BIN()
@@ -141,20 +184,15 @@ class BIN_SET:
                 offspring_3.random_bin(feature_names,min_bin_size,max_bin_init_size,random)
                 #if iteration == 49:
                 #    print(str(offspring_3.feature_list)+'_'+str(offspring_3.group_threshold))
-            offspring_3.evaluate(df.loc[:,feature_names],df.loc[:,outcome_label],df.loc[:,censor_label],outcome_type,fitness_metric,log_rank_weighting,outcome_label,censor_label,min_thresh,max_thresh,
-                                int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residuals,df.loc[:,covariates])
-            offspring_3.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
-            #if iteration == 49:
-            #    print(str(offspring_3.feature_list)+'_'+str(offspring_3.group_threshold))
-            if not self.equivalent_bin_in_pop(offspring_3,iteration):
-                self.offspring_pop.append(offspring_3)
+            self.offspring_pop.append(offspring_3) # Evaluated later in evaluate_offspring()
+            self.offspring_keys.add(offspring_3.bin_key())
 
         # Crossover
         offspring_1.uniform_crossover(offspring_2,crossover_prob,threshold_evolving,multi_thresholding,max_thresh,random)
 
         # Mutation - check for duplicate rules
-        offspring_1.mutation(mutation_prob,feature_names,min_bin_size,max_bin_size,max_bin_init_size,threshold_evolving,multi_thresholding,min_thresh,max_thresh,random)
-        offspring_2.mutation(mutation_prob,feature_names,min_bin_size,max_bin_size,max_bin_init_size,threshold_evolving,multi_thresholding,min_thresh,max_thresh,random)
+        offspring_1.mutation(mutation_prob,feature_names,self.feature_index,min_bin_size,max_bin_size,max_bin_init_size,threshold_evolving,multi_thresholding,min_thresh,max_thresh,random)
+        offspring_2.mutation(mutation_prob,feature_names,self.feature_index,min_bin_size,max_bin_size,max_bin_init_size,threshold_evolving,multi_thresholding,min_thresh,max_thresh,random)
 
         #if iteration == 49:
         #    print('Offspring1:'+str(offspring_1.feature_list)+'_'+str(offspring_1.group_threshold))
@@ -167,17 +205,8 @@ class BIN_SET:
             offspring_1.random_bin(feature_names,min_bin_size,max_bin_init_size,random)
             #if iteration == 49:
             #    print(str(offspring_1.feature_list)+'_'+str(offspring_1.group_threshold))
-
-        # Offspring 1 Evalution 
-        offspring_1.evaluate(df.loc[:,feature_names],df.loc[:,outcome_label],df.loc[:,censor_label],outcome_type,fitness_metric,log_rank_weighting,outcome_label,censor_label,min_thresh,max_thresh,
-                             int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residuals,df.loc[:,covariates])
-        offspring_1.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
-
-        #Add New Offspring 1 to the Population
-        #if iteration == 49:
-        #    print(str(offspring_1.feature_list)+'_'+str(offspring_1.group_threshold))
-        if not self.equivalent_bin_in_pop(offspring_1,iteration):
-            self.offspring_pop.append(offspring_1)
+        self.offspring_pop.append(offspring_1)
+        self.offspring_keys.add(offspring_1.bin_key())
 
         #if iteration == 49:
         #    print('off2')
@@ -186,56 +215,93 @@ class BIN_SET:
             offspring_2.random_bin(feature_names,min_bin_size,max_bin_init_size,random)
             #if iteration == 49:
             #    print(str(offspring_2.feature_list)+'_'+str(offspring_2.group_threshold))
+        self.offspring_pop.append(offspring_2)
+        self.offspring_keys.add(offspring_2.bin_key())
+
+
+    def evaluate_offspring(self,iterations,iteration,feature_names,threshold_evolving,multi_thresholding,min_thresh,max_thresh,outcome_type,fitness_metric,
+                           int_thresh,group_thresh_list,group_strata_min,penalty,n_jobs):
+        # Offspring bins are independent of one another, so the batch generated this iteration is evaluated in parallel (when n_jobs != 1)
+        # Data comes from the arrays extracted when the population was initialized (feature_array, log_rank_risk_set, residual_ranks)
+        unevaluated = [bin for bin in self.offspring_pop if bin.pre_fitness is None]
+        self.offspring_pop = [bin for bin in self.offspring_pop if bin.pre_fitness is not None]
+        self.offspring_keys = {bin.bin_key() for bin in self.offspring_pop}
+        adaptive = BIN.adaptive_thresholding(group_thresh_list,threshold_evolving,iterations,iteration)
+        evaluated = self.evaluate_bins(unevaluated,adaptive,outcome_type,fitness_metric,min_thresh,max_thresh,int_thresh,group_thresh_list,
+                                       threshold_evolving,multi_thresholding,iterations,iteration,group_strata_min,penalty,feature_names,n_jobs)
+
+        #Add New Offspring to the Population - evaluation may select new thresholds, so re-check for duplicate bins
+        for offspring in evaluated:
+            if not self.equivalent_bin_in_pop(offspring,iteration):
+                self.offspring_pop.append(offspring)
+                self.offspring_keys.add(offspring.bin_key())
+
+
+    def evaluate_bins(self,bins,adaptive,outcome_type,fitness_metric,min_thresh,max_thresh,int_thresh,group_thresh_list,
+                      threshold_evolving,multi_thresholding,iterations,iteration,group_strata_min,penalty,feature_names,n_jobs):
+        # Bin metric score evaluation and fitness metric calculation (in parallel when n_jobs != 1). Only the first bin of each evaluation key is scored -
+        # bins that repeat an earlier bin of the batch, or recreate one scored earlier in the run (e.g. lost to deletion), reuse the stored evaluation
+        keys = [bin.evaluation_key(adaptive) for bin in bins]
+        to_score = {}
+        for bin, key in zip(bins,keys):
+            if key not in self.evaluation_memo and key not in to_score:
+                to_score[key] = bin
+        # One task per worker rather than per bin, so the log-rank risk set and residual rank arrays are pickled once per worker each generation
+        # (workers never receive the feature matrix - just the feature sums of the bins they score)
+        score_bins = list(to_score.values())
+        n_tasks = max(1,min(effective_n_jobs(n_jobs),len(score_bins)))
+        batches = [score_bins[i*len(score_bins)//n_tasks:(i+1)*len(score_bins)//n_tasks] for i in range(n_tasks)]
+        scored = Parallel(n_jobs=n_jobs)(delayed(evaluate_bin_batch)(batch,[self.bin_feature_sums(bin) for bin in batch],self.log_rank_risk_set,outcome_type,
+                                                                     fitness_metric,min_thresh,max_thresh,int_thresh,group_thresh_list,threshold_evolving,
+                                                                     multi_thresholding,iterations,iteration,self.residual_ranks,self.residual_tie_correction,group_strata_min,
+                                                                     penalty,feature_names) for batch in batches)
+        scored = [bin for batch in scored for bin in batch]
+        scored = dict(zip(to_score,scored))
+        evaluated = []
+        for bin, key in zip(bins,keys):
+            if key in scored:
+                bin = scored.pop(key) # Scored bin (returned by the worker) takes the place of the first bin with this key
+                self.evaluation_memo[key] = bin.get_evaluation()
+            else:
+                bin.load_evaluation(self.evaluation_memo[key])
+                bin.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
+            evaluated.append(bin)
+        return evaluated
 
-        # Offspring 2 Evalution 
-        offspring_2.evaluate(df.loc[:,feature_names],df.loc[:,outcome_label],df.loc[:,censor_label],outcome_type,fitness_metric,log_rank_weighting,outcome_label,censor_label,min_thresh,max_thresh,
-                             int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residuals,df.loc[:,covariates])
-        offspring_2.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
 
-        #Add New Offspring 2 to the Population
-        #if iteration == 49:
-        #    print(str(offspring_2.feature_list)+'_'+str(offspring_2.group_threshold))
-        if not self.equivalent_bin_in_pop(offspring_2,iteration):
-            self.offspring_pop.append(offspring_2)
+    def index_bin_pop(self):
+        # Rebuild the bin_pop key set (bin_pop changes through offspring addition, deletion, and cleaning)
+        self.bin_pop_keys = {bin.bin_key() for bin in self.bin_pop}
 
 
     def equivalent_bin_in_pop(self,new_bin,iteration):
-        for existing_bin in self.offspring_pop:
-            if new_bin.is_equivalent(existing_bin):
-                #if iteration == 49:
-                #    print('duplicate in offpop')
-                #    print(str(new_bin.feature_list)+'_'+str(new_bin.group_threshold))
-                #    print(str(existing_bin.feature_list)+'_'+str(new_bin.group_threshold))
-                return True
-            
-        for existing_bin in self.bin_pop:
-            if new_bin.is_equivalent(existing_bin):
-                #if iteration == 49:
-                #    print('duplicate in pop')
-                #    print(str(new_bin.feature_list)+'_'+str(new_bin.group_threshold))
-                #    print(str(existing_bin.feature_list)+'_'+str(new_bin.group_threshold))
-                return True
+        # Set lookups against the keys of both populations rather than comparing against every bin
+        key = new_bin.bin_key()
+        return key in self.offspring_keys or key in self.bin_pop_keys
+
+
+    def zero_fitness_bin_deletion(self,pop_size):
+        # Automatically delete bins with a fitness of 0 (no more than needed to reach pop_size) - the population is rebuilt in one pass
+        # rather than deleting one index at a time
+        excess = len(self.bin_pop) - pop_size
+        if excess <= 0:
+            return
+        delete_indexes = set([i for i, bin in enumerate(self.bin_pop) if bin.fitness == 0][:excess])
+        if delete_indexes:
+            self.bin_pop = [bin for i, bin in enumerate(self.bin_pop) if i not in delete_indexes]
 
-        return False
-        
 
     def similarity_bin_deletion(self,pop_size,diversity_pressure,random):
-        # Automatically delete bins with a fitness of 0
-        delete_indexes = []
-        i = 0
-        for bin in self.bin_pop:
-            if bin.fitness == 0 and len(delete_indexes)<(len(self.bin_pop)-pop_size):
-                delete_indexes.append(i)
-            i += 1
-        delete_indexes.sort(reverse=True) #sort in descending order so deletion does not affect subsequent indexes
-        for index in delete_indexes:
-            del self.bin_pop[index]
+        self.zero_fitness_bin_deletion(pop_size)
 
         #Prepare for deletion
         list_of_feature_lists = []
         for bin in self.bin_pop:
             bin_composition = copy.deepcopy(bin.feature_list)
-            bin_composition.append('Low_Thresh_'+str(bin.group_threshold[0])+',High_Thresh_' + str(bin.group_threshold_list[1]))
+            if len(bin.group_threshold_list) == 1:
+                bin_composition.append('Thresh_'+str(bin.group_threshold_list[0]))
+            else:
+                bin_composition.append('Low_Thresh_'+str(bin.group_threshold_list[0])+',High_Thresh_' + str(bin.group_threshold_list[1]))
             list_of_feature_lists.append(bin_composition)
 
         # Vectorize the lists using TF-IDF
@@ -285,16 +351,7 @@ class BIN_SET:
 
 
     def probabilistic_bin_deletion(self,pop_size,elitism,random):
-        # Automatically delete bins with a fitness of 0
-        delete_indexes = []
-        i = 0
-        for bin in self.bin_pop:
-            if bin.fitness == 0 and len(delete_indexes)<(len(self.bin_pop)-pop_size):
-                delete_indexes.append(i)
-            i += 1
-        delete_indexes.sort(reverse=True) #sort in descending order so deletion does not affect subsequent indexes
-        for index in delete_indexes:
-            del self.bin_pop[index]
+        self.zero_fitness_bin_deletion(pop_size)
 
         # Preseve any proportion of elite bins specified
         #x = 0
@@ -312,38 +369,33 @@ class BIN_SET:
 
         # ROULETTE WHEEL SELECTION - deletion selection probability inversely related to bin fitness
         # Delete remaining bins required (from non-elite set) based on bin selection that is inversely proportional to bin fitness
+        # Inverse fitness is held in a list parallel to remaining_bins (by position), and the latest deletion probability of each bin is only
+        # written back to the surviving bins once deletion is done
+        inverse_fitness = [1/bin.fitness if bin.fitness != 0 else None for bin in remaining_bins]
+        latest_probabilities = [None] * len(remaining_bins)
         while len(remaining_bins)+len(elite_bins) > pop_size:
-            try:
+            if None in inverse_fitness: # Deletion probabilities are undefined while a bin with a fitness of 0 remains
+                index = random.choices(range(len(remaining_bins)))[0]
+            else:
                 #Calculate total fitness across all bins
-                total_fitness = sum(1/bin.fitness for bin in remaining_bins)
+                total_fitness = sum(inverse_fitness)
                 # Calculate deletion probabilities for each object
-                deletion_probabilities = [(1/bin.fitness) / total_fitness for bin in remaining_bins]
-                remaining_index = 0
-                for bin in remaining_bins:
-                    bin.update_deletion_prop(deletion_probabilities[remaining_index],None)
-                    remaining_index += 1
-                index = random.choices(range(len(remaining_bins)), weights=deletion_probabilities)[0]
-            except:
-                index = random.choices(range(len(remaining_bins)))[0]
+                latest_probabilities = [value / total_fitness for value in inverse_fitness]
+                index = random.choices(range(len(remaining_bins)), weights=latest_probabilities)[0]
             del remaining_bins[index]
+            del inverse_fitness[index]
+            del latest_probabilities[index]
 
+        for bin, deletion_prop in zip(remaining_bins,latest_probabilities):
+            if deletion_prop is not None:
+                bin.update_deletion_prop(deletion_prop,None)
         self.bin_pop = elite_bins + remaining_bins
 
 
     def deterministic_bin_deletion(self,pop_size):
-        # Automatically delete bins with a fitness of 0
-        delete_indexes = []
-        i = 0
-        for bin in self.bin_pop:
-            if bin.fitness == 0 and len(delete_indexes)<(len(self.bin_pop)-pop_size):
-                delete_indexes.append(i)
-            i += 1
-        delete_indexes.sort(reverse=True) #sort in descending order so deletion does not affect subsequent indexes
-        for index in delete_indexes:
-            del self.bin_pop[index]
-        # Delete remaining lowest fitness bins until pop_size reached
-        while len(self.bin_pop) > pop_size:
-            del self.bin_pop[-1]
+        self.zero_fitness_bin_deletion(pop_size)
+        # Delete remaining lowest fitness bins until pop_size reached (bin_pop is in global ranking order)
+        self.bin_pop = self.bin_pop[:pop_size]
 
 
     def add_offspring_into_pop(self,iteration):
@@ -354,6 +406,7 @@ class BIN_SET:
         #    print("---------------------------------------------------------")
         self.bin_pop = self.bin_pop + self.offspring_pop
         self.offspring_pop = []
+        self.offspring_keys = set()
 
 
     def sort_feature_lists(self):
@@ -384,3 +437,18 @@ class BIN_SET:
         self.bin_pop = temp_pop
 
 
+def evaluate_bin(bin,feature_sums,log_rank_risk_set,outcome_type,fitness_metric,min_thresh,max_thresh,
+                 int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residual_ranks,residual_tie_correction,group_strata_min,penalty,feature_names):
+    # Bin metric score evaluation and fitness metric calculation (module level so that it can be dispatched to worker processes)
+    bin.evaluate(feature_sums,log_rank_risk_set,outcome_type,fitness_metric,min_thresh,max_thresh,
+                 int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residual_ranks,residual_tie_correction)
+    bin.calculate_pre_fitness(group_strata_min,penalty,fitness_metric,feature_names)
+    return bin
+
+
+def evaluate_bin_batch(bins,feature_sums_list,log_rank_risk_set,outcome_type,fitness_metric,min_thresh,max_thresh,
+                       int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residual_ranks,residual_tie_correction,group_strata_min,penalty,feature_names):
+    # Evaluates a worker's share of the bins in one task
+    return [evaluate_bin(bin,feature_sums,log_rank_risk_set,outcome_type,fitness_metric,min_thresh,max_thresh,
+                         int_thresh,group_thresh_list,threshold_evolving,multi_thresholding,iterations,iteration,residual_ranks,residual_tie_correction,group_strata_min,penalty,feature_names)
+            for bin, feature_sums in zip(bins,feature_sums_list)]
@@ -396,12 +396,23 @@ def plot_adj_HR_metric_product(residuals,bin_pop,show=True,save=False,output_fol
             plt.show()
 
 
-def cox_prop_hazard(bin_df, outcome_label, censor_label): #make bin variable beetween 0 and 1
+def cox_prop_hazard(bin_df, outcome_label, censor_label, initial_point=None): #make bin variable beetween 0 and 1
     cph = CoxPHFitter()
-    cph.fit(bin_df,outcome_label,event_col=censor_label, show_progress=False)
+    if initial_point is not None:
+        initial_point = np.array(initial_point,dtype=float) # lifelines updates the starting point in place
+    cph.fit(bin_df,outcome_label,event_col=censor_label, show_progress=False, initial_point=initial_point)
     return cph.summary
 
 
+def bin_cox_prop_hazard(bin_column, bin_df, outcome_label, censor_label, initial_point=None):
+    # Hazard ratio, its 95% CI, and p-value for one bin column (module level so that bins can be fit in worker processes)
+    try:
+        summary = cox_prop_hazard(bin_df.assign(Bin=bin_column),outcome_label,censor_label,initial_point)
+        return summary['exp(coef)'].iloc[0], str(summary['exp(coef) lower 95%'].iloc[0])+'-'+str(summary['exp(coef) upper 95%'].iloc[0]), summary['p'].iloc[0]
+    except:
+        return 0, None, None
+
+
 def match_prefix(feature, locust_names):
     """
     :param feature: the feature
@@ -0,0 +1,108 @@
+import random
+import numpy as np
+import pytest
+from scipy.stats import kruskal, rankdata, tiecorrect
+from skfibers.methods.bin import BIN, FeatureComplement
+
+
+def tied_residuals(rng, n):
+    return np.round(rng.normal(size=n), 1) # Rounded - many tied residuals
+
+
+@pytest.mark.parametrize('n_groups', [2, 3])
+@pytest.mark.parametrize('seed', range(5))
+def test_kruskal_wallis_matches_scipy(n_groups, seed):
+    rng = np.random.default_rng(seed)
+    residuals = tied_residuals(rng, 200)
+    labels = rng.integers(0, n_groups, len(residuals))
+    ranks = rankdata(residuals)
+    statistic, p_value = BIN.kruskal_wallis(ranks, [labels == group for group in range(n_groups)], tiecorrect(ranks))
+    expected = kruskal(*[residuals[labels == group] for group in range(n_groups)])
+    assert statistic == pytest.approx(expected.statistic, rel=1e-12)
+    assert p_value == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def evaluate_residuals(feature_sums, residuals, group_thresh_list):
+    ranks = rankdata(residuals)
+    bin = BIN()
+    return bin.evaluate_for_thresholds(group_thresh_list, feature_sums, 'survival', 'residuals', ranks, tiecorrect(ranks))
+
+
+def test_residual_groups_match_scipy():
+    rng = np.random.default_rng(11)
+    feature_sums = rng.integers(0, 5, 300)
+    residuals = tied_residuals(rng, 300)
+    _, _, residuals_score, residuals_p_value, count_bt, count_mt, count_at = evaluate_residuals(feature_sums, residuals, [1, 3])
+    expected = kruskal(residuals[feature_sums <= 1], residuals[(feature_sums > 1) & (feature_sums <= 3)], residuals[feature_sums > 3])
+    assert residuals_score == pytest.approx(abs(expected.statistic), rel=1e-12)
+    assert residuals_p_value == pytest.approx(expected.pvalue, rel=1e-9)
+    assert (count_bt, count_mt, count_at) == (np.count_nonzero(feature_sums <= 1), np.count_nonzero((feature_sums > 1) & (feature_sums <= 3)),
+                                              np.count_nonzero(feature_sums > 3))
+
+
+@pytest.mark.parametrize('group_thresh_list', [[0, 1], [2], [5, 6]])
+def test_residual_groups_with_an_empty_group(group_thresh_list):
+    # Feature sums of 0 and 2 only - each threshold list leaves at least one of the three groups empty, which scores 0
+    rng = np.random.default_rng(5)
+    feature_sums = rng.choice([0, 2], 120)
+    residuals = tied_residuals(rng, 120)
+    _, _, residuals_score, residuals_p_value, count_bt, count_mt, count_at = evaluate_residuals(feature_sums, residuals, group_thresh_list)
+    assert 0 in (count_bt, count_mt, count_at)
+    assert residuals_score == 0
+    assert residuals_p_value is None
+
+
+def test_residuals_all_tied():
+    feature_sums = np.array([0, 0, 1, 1, 2, 2])
+    _, _, residuals_score, residuals_p_value, _, _, _ = evaluate_residuals(feature_sums, np.zeros(6), [0, 1])
+    assert residuals_score == 0
+    assert residuals_p_value is None
+
+
+FEATURE_NAMES = ['F_'+str(i) for i in range(40)]
+FEATURE_INDEX = {feature: index for index, feature in enumerate(FEATURE_NAMES)}
+
+
+def complement(feature_list):
+    return [feature for feature in FEATURE_NAMES if feature not in feature_list]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_feature_complement_tracks_bin(seed):
+    rng = random.Random(seed)
+    bin = BIN()
+    bin.feature_list = rng.sample(FEATURE_NAMES, rng.randint(1, 10))
+    other_features = bin.features_not_in_bin(FEATURE_NAMES, FEATURE_INDEX)
+    for _ in range(200): # Random additions, deletions, and swaps, as made by mutation
+        operation = rng.choice(['A', 'D', 'S'])
+        if operation != 'A' and len(bin.feature_list) > 1:
+            feature = rng.choice(bin.feature_list)
+            bin.feature_list.remove(feature)
+            other_features.remove_from_bin(feature)
+        if operation != 'D' and len(other_features) > 0:
+            random_feature = rng.choice(other_features)
+            assert random_feature not in bin.feature_list
+            bin.feature_list.append(random_feature)
+            other_features.add_to_bin(random_feature)
+        assert len(other_features) == len(FEATURE_NAMES) - len(bin.feature_list)
+        assert [other_features[i] for i in range(len(other_features))] == complement(bin.feature_list)
+
+
+def test_feature_complement_of_full_bin():
+    other_features = FeatureComplement(FEATURE_NAMES, FEATURE_INDEX, FEATURE_NAMES)
+    assert len(other_features) == 0
+    with pytest.raises(IndexError):
+        random.Random(0).choice(other_features)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_mutation_keeps_valid_bins(seed):
+    rng = random.Random(seed)
+    bin = BIN()
+    bin.feature_list = rng.sample(FEATURE_NAMES, 5)
+    bin.group_threshold_list = [1]
+    for _ in range(100):
+        bin.mutation(0.5, FEATURE_NAMES, FEATURE_INDEX, 1, 15, 10, False, False, 0, 3, rng)
+        assert 1 <= len(bin.feature_list) <= 15
+        assert len(set(bin.feature_list)) == len(bin.feature_list)
+        assert set(bin.feature_list) <= set(FEATURE_NAMES)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from skfibers.methods.data_handling import feature_sum_dtype, feature_value_bound, sum_features
+from skfibers.methods import data_handling
+from skfibers.methods.data_handling import prepare_data
+
+
+@pytest.mark.parametrize('dtype, bin_size, expected', [(np.int8, 10, np.int16), (np.int8, 20000, np.int32), (np.int64, 10, np.int16),
+                                                       (np.float64, 10, np.float64), (np.bool_, 10, np.int64)])
+def test_feature_sum_dtype(dtype, bin_size, expected):
+    feature_array = np.random.default_rng(0).integers(0, 3, (20, bin_size)).astype(dtype)
+    assert feature_sum_dtype(feature_array, bin_size, feature_value_bound(feature_array)) == expected
+    assert np.issubdtype(feature_sum_dtype(feature_array), np.integer) == (dtype != np.float64) # Unbounded - int64 or float64
+    sums = sum_features(feature_array, list(range(bin_size)), feature_value_bound(feature_array))
+    np.testing.assert_array_equal(sums, feature_array.astype(np.int64).sum(axis=1))
+
+
+def test_large_feature_values_widen_the_accumulator():
+    feature_array = np.full((4, 3), 2**30, dtype=np.int64)
+    assert feature_sum_dtype(feature_array, 3, feature_value_bound(feature_array)) == np.int64
+    np.testing.assert_array_equal(sum_features(feature_array, [0, 1, 2], feature_value_bound(feature_array)), np.full(4, 3 * 2**30))
+
+
+@pytest.mark.parametrize('block', [data_handling.INVARIANT_CHECK_BLOCK, 12, 1]) # All, two, and one column(s) per block
+def test_prepare_data_drops_invariant_columns(monkeypatch, block):
+    monkeypatch.setattr(data_handling, 'INVARIANT_CHECK_BLOCK', block)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'Duration': rng.exponential(1, 6), 'Censoring': rng.integers(0, 2, 6), 'C_1': np.ones(6),
+                       'constant': np.full(6, 2), 'variable': [0, 1, 0, 2, 0, 1], 'all_missing': np.full(6, np.nan),
+                       'missing_first': [np.nan, 1, 1, 1, 1, 1], 'constant_missing_later': [1, 1, np.nan, 1, 1, 1],
+                       'constant_text': ['a'] * 6, 'text': ['a'] * 5 + ['b']})
+    expected = [col for col in df.columns if col not in ('Duration', 'Censoring', 'C_1') and len(df[col].unique()) > 1]
+    df, feature_names = prepare_data(df, 'Duration', 'Censoring', ['C_1'])
+    assert feature_names == expected == ['variable', 'missing_first', 'constant_missing_later', 'text']
+    assert list(df.columns) == ['Duration', 'Censoring', 'C_1'] + expected
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from skfibers.fibers import FIBERS
+from skfibers.experiments.survival_sim_simple import survival_data_simulation
+
+
+@pytest.fixture(scope='module')
+def data():
+    data = survival_data_simulation(instances=300, total_features=20, predictive_features=5, low_risk_proportion=0.5, threshold=0,
+                                    feature_frequency_range=(0.1, 0.4), noise_frequency=0.0, class0_time_to_event_range=(1.5, 0.2),
+                                    class1_time_to_event_range=(1, 0.2), censoring_frequency=0.2, random_seed=42)
+    data = data.drop('TrueRiskGroup', axis=1)
+    return data.astype({feature: np.int64 for feature in data.columns if feature not in ('Duration', 'Censoring')}) # 0/1 coded features
+
+
+@pytest.fixture(scope='module')
+def fitted(data):
+    fibers = FIBERS(outcome_label='Duration', censor_label='Censoring', iterations=5, pop_size=20, group_thresh_list=None, min_thresh=0, max_thresh=3,
+                    random_seed=42)
+    return fibers.fit(data)
+
+
+def test_transform_keeps_integer_sums(fitted, data):
+    bin_columns = ['Bin_'+str(i) for i in range(len(fitted.set.bin_pop))]
+    sums = fitted.transform(data, full_sums=True)
+    groups = fitted.transform(data)
+    assert (sums[bin_columns].dtypes == np.int64).all()
+    assert (groups[bin_columns].dtypes == np.int64).all()
+    for bin_column, bin in zip(bin_columns, fitted.set.bin_pop):
+        assert np.array_equal(sums[bin_column].to_numpy(), data[bin.feature_list].sum(axis=1).to_numpy())
+
+
+def test_transform_of_float_features(fitted, data):
+    float_data = data.astype({feature: np.float64 for feature in fitted.feature_names})
+    bin_columns = ['Bin_'+str(i) for i in range(len(fitted.set.bin_pop))]
+    sums = fitted.transform(float_data, full_sums=True)
+    assert (sums[bin_columns].dtypes == np.float64).all()
+    assert (fitted.transform(float_data)[bin_columns].dtypes == np.int64).all()
+    np.testing.assert_array_equal(sums[bin_columns].to_numpy(), fitted.transform(data, full_sums=True)[bin_columns].to_numpy())
+
+
+def test_single_bin_predict_labels(fitted, data):
+    sums = fitted.transform(data, full_sums=True)
+    for bin_number, bin in enumerate(fitted.set.bin_pop):
+        predictions = fitted.predict(data, bin_number=bin_number)
+        assert np.array_equal(predictions, (sums['Bin_'+str(bin_number)] > bin.group_threshold_list[-1]).astype(int).to_numpy())
+
+
+def test_predict_branches_share_labels(data):
+    fibers = FIBERS(outcome_label='Duration', censor_label='Censoring', iterations=5, pop_size=20, group_thresh_list=[0, 1], random_seed=42)
+    fibers.fit(data)
+    votes = fibers.predict(data)
+    single_bin = np.array([fibers.predict(data, bin_number=bin_number) for bin_number in range(len(fibers.set.bin_pop))])
+    assert set(np.unique(votes)) <= {0, 1}
+    assert set(np.unique(single_bin)) <= {0, 1}
+    # Instances every bin places in the same strata get that label from the population vote too
+    agreed = (single_bin == single_bin[0]).all(axis=0)
+    assert agreed.any()
+    assert np.array_equal(votes[agreed], single_bin[0][agreed])
+
+
+@pytest.mark.parametrize('multi_thresholding', [False, True])
+def test_similarity_deletion(data, multi_thresholding):
+    # diversity_pressure > 0 deletes bins by similarity, labelling each bin by its one or two thresholds
+    fibers = FIBERS(outcome_label='Duration', censor_label='Censoring', iterations=5, pop_size=20, diversity_pressure=3, group_thresh_list=None,
+                    min_thresh=0, max_thresh=3, multi_thresholding=multi_thresholding, random_seed=42)
+    fibers.fit(data)
+    assert len(fibers.set.bin_pop) == 20
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from lifelines.statistics import multivariate_logrank_test
+from skfibers.methods.logrank import logrank_risk_set, threshold_logrank_tests
+
+WEIGHTINGS = [None, 'wilcoxon', 'tarone-ware', 'peto']
+THRESHOLD_LISTS = [[low, high] for low in range(0, 4) for high in range(low + 1, 5)] + [[threshold] for threshold in range(0, 5)]
+
+
+def threshold_groups(feature_sums, thresholds):
+    # 0 = at/below the low threshold, 1 = between thresholds, 2 = above the high threshold (single thresholds have no middle group)
+    if len(thresholds) == 1:
+        return np.where(feature_sums <= thresholds[0], 0, 2)
+    return np.where(feature_sums <= thresholds[0], 0, np.where(feature_sums <= thresholds[1], 1, 2))
+
+
+def lifelines_test(durations, groups, events, weightings):
+    order = np.argsort(groups, kind='stable')
+    try:
+        result = multivariate_logrank_test(durations[order], groups[order], event_observed=events[order], weightings=weightings)
+    except Exception:
+        return None
+    return result.test_statistic, result.p_value
+
+
+def assert_matches_lifelines(feature_sums, durations, events, threshold_lists, weightings):
+    tests = threshold_logrank_tests(feature_sums, logrank_risk_set(durations, events, weightings), threshold_lists)
+    assert len(tests) == len(threshold_lists)
+    for thresholds, test in zip(threshold_lists, tests):
+        expected = lifelines_test(durations, threshold_groups(feature_sums, thresholds), events, weightings)
+        if expected is None:
+            assert test is None
+            continue
+        assert test is not None
+        np.testing.assert_allclose(test[0], expected[0], rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(test[1], expected[1], rtol=1e-8, atol=1e-300, equal_nan=True)
+
+
+@pytest.mark.parametrize('weightings', WEIGHTINGS)
+@pytest.mark.parametrize('seed', range(6))
+def test_matches_lifelines(weightings, seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(20, 300))
+    feature_sums = rng.integers(0, rng.integers(2, 7), n) # Few distinct values - many ties
+    durations = np.round(rng.exponential(1 + 0.3 * feature_sums), int(rng.integers(0, 3))) # Rounded - tied survival times
+    events = (rng.random(n) < rng.uniform(0.3, 0.9)).astype(int)
+    assert_matches_lifelines(feature_sums, durations, events, THRESHOLD_LISTS, weightings)
+
+
+@pytest.mark.parametrize('weightings', WEIGHTINGS)
+def test_float_feature_sums(weightings):
+    rng = np.random.default_rng(7)
+    feature_sums = rng.integers(0, 5, 150).astype(float)
+    durations = np.round(rng.exponential(1, 150), 1)
+    events = (rng.random(150) < 0.7).astype(int)
+    assert_matches_lifelines(feature_sums, durations, events, [[0.5, 2.5], [1.5], [3]], weightings)
+
+
+@pytest.mark.parametrize('weightings', WEIGHTINGS)
+def test_single_group(weightings):
+    # Every instance falls at or below the threshold - lifelines reports a statistic of 0 with an undefined p-value
+    rng = np.random.default_rng(3)
+    feature_sums = rng.integers(0, 3, 80)
+    durations = np.round(rng.exponential(1, 80), 1)
+    events = (rng.random(80) < 0.6).astype(int)
+    assert_matches_lifelines(feature_sums, durations, events, [[4], [3, 4]], weightings)
+    statistic, p_value = threshold_logrank_tests(feature_sums, logrank_risk_set(durations, events, weightings), [[4]])[0]
+    assert statistic == pytest.approx(0.0, abs=1e-12)
+    assert np.isnan(p_value)
+
+
+def test_unsupported_weighting():
+    with pytest.raises(ValueError):
+        logrank_risk_set(np.arange(5.0), np.ones(5), 'fleming-harrington')
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from skfibers.experiments.survival_sim_simple import survival_data_simulation
+
+
+@pytest.mark.parametrize('instances, total_features', [(40, 60), (60, 60), (200, 30)])
+def test_survival_simulation_shape(instances, total_features):
+    # Datasets may have more features than instances
+    df = survival_data_simulation(instances=instances, total_features=total_features, predictive_features=5, censoring_frequency=0.3, random_seed=7)
+    assert df.shape == (instances, total_features + 3)
+    assert df['Censoring'].isin([0, 1]).all()
+
+
+def test_survival_simulation_is_seeded():
+    kwargs = dict(instances=80, total_features=100, predictive_features=5, censoring_frequency=0.3, random_seed=11)
+    first = survival_data_simulation(**kwargs)
+    np.random.seed(0) # Unrelated global state does not leak into seeded simulations
+    second = survival_data_simulation(**kwargs)
+    assert first.equals(second)